@@ -4,25 +4,64 @@ Ollama + MCP Connector (Enhanced Edition)
 Ultra-stable connector that links Ollama to a local MCP server.
 Strictly enforces tool-based reasoning with no code output.
 Includes:
+- ConnectorClient: pooled keep-alive sessions, usable as a library
+- Local fast-path rendering of known tool results (LLM summary only as fallback)
+- Persistent chat history (system prompt prefilled once, KV cache reused)
+- Streaming generation that dispatches tool calls as soon as their JSON closes
+- Multiple tool calls per reply, executed concurrently as one JSON-RPC batch
 - Automatic fallback for ignored tool calls
-- Broader rain detection & smart notifications
+- Broader rain detection & smart notifications, delivered in the background
 - Built-in logging and error resilience
+- Optional tracing of each turn (LLM, tool detection, MCP calls), with
+  trace context forwarded to the MCP server (see tracing.py)
 """
 
 import requests
 import json
+import os
+import queue
 import re
+import threading
 import time
 from datetime import datetime
+from typing import Callable, Optional
+from requests.adapters import HTTPAdapter
+
+import tracing
 
 # ----------------------------------------------------------------------
 # Configuration
 # ----------------------------------------------------------------------
-OLLAMA_URL = "http://localhost:11434/api/generate"
-MCP_URL = "http://localhost:9000/mcp"
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434").rstrip("/")
+OLLAMA_URL = f"{OLLAMA_BASE_URL}/api/generate"
+OLLAMA_CHAT_URL = f"{OLLAMA_BASE_URL}/api/chat"
+MCP_URL = os.getenv("MCP_URL", "http://localhost:9000/mcp")
 MODEL = "phi3:mini"  # Suggested: "phi3:mini", "llama3", or "mistral"
 ALERT_KEYWORDS = ["rain", "drizzle", "shower", "storm"]
 DEFAULT_CITY = "Chennai"
+STREAM_RESPONSES = True  # stream tokens and stop at the first complete tool call
+KEEP_ALIVE = "30m"       # keep the model (and its prompt cache) loaded between turns
+MAX_HISTORY_TURNS = 8    # user turns (with replies and tool results) kept after the system prompt
+POOL_SIZE = 4            # keep-alive connections per endpoint (Ollama, MCP)
+NOTIFY_MAX_ATTEMPTS = 4  # background alert delivery attempts
+NOTIFY_BACKOFF_SECONDS = 1.0  # first retry delay, doubled after each failure
+NOTIFY_QUEUE_SIZE = 100
+MCP_MAX_RETRY_AFTER = 5.0  # longest Retry-After wait honoured when the server sheds load
+MCP_OVERLOADED = -32001    # JSON-RPC error code for a call the server shed
+tracing.set_service_name("connector")
+
+SYSTEM_INSTRUCTION = (
+    "SYSTEM INSTRUCTION:\n"
+    "You are an AI assistant connected to a local MCP server.\n"
+    "You cannot write or show code.\n"
+    "You must call tools for all external actions.\n"
+    "Available tools:\n"
+    "1. get_weather(city: string)\n"
+    "2. send_notification(notification_input: string)\n"
+    "Always respond ONLY in JSON format like:\n"
+    "{ \"name\": \"<tool_name>\", \"arguments\": { ... } }\n"
+    "For several independent actions, output one such object per action.\n"
+)
 
 # ----------------------------------------------------------------------
 # Utility: Print timestamps for clarity
@@ -31,79 +70,581 @@ def log(msg: str):
     print(f"[{datetime.now().strftime('%H:%M:%S')}] {msg}")
 
 # ----------------------------------------------------------------------
-# Helper: Query Ollama
+# Helper: Detect JSON tool calls
 # ----------------------------------------------------------------------
-def ask_ollama(prompt: str, max_retries=3) -> str:
-    """Send a prompt to Ollama, retry on failure."""
-    payload = {"model": MODEL, "prompt": prompt, "stream": False}
-    for attempt in range(max_retries):
+def extract_tool_calls(text: str) -> list:
+    """Every {"name", "arguments"} object in `text`, nested JSON included."""
+    detector = ToolCallDetector()
+    detector.feed(text)
+    return detector.calls
+
+def detect_tool_call(text: str):
+    """Detect the first valid JSON tool call block."""
+    calls = extract_tool_calls(text)
+    return calls[0] if calls else (None, None)
+
+class ToolCallDetector:
+    """
+    Incremental tool-call extractor for (streamed) model output.
+    Tracks open braces, ignoring braces inside JSON strings, and checks
+    every object that closes for a {"name", "arguments"} call, so calls are
+    found one after another, inside a JSON array or wrapper object, and
+    after a stray unclosed '{' in prose. Objects inside what looks like a
+    call are left to that call. A top-level block that closes without
+    yielding a call is rescanned from just after its '{', and an open block
+    is given up once a call starts where it would have to be inside one of
+    its strings (a stray quote in prose).
+    """
+
+    # What may follow a call when another call is still coming: whitespace,
+    # a separating comma or an opening array bracket.
+    _BETWEEN_CALLS = re.compile(r"[\s,\[]*")
+    _CALL_START = re.compile(r'\{\s*"(?:name|arguments)"\s*:')
+
+    def __init__(self):
+        self.text = ""
+        self.calls: list = []
+        self.end = 0  # offset just past the last complete tool call
+        self._pos = 0  # next offset to scan
+        self._open: list[int] = []  # offsets of unclosed '{'
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> list:
+        """Consume a chunk; return the calls completed within it."""
+        found = []
+        self.text += chunk
+        text, i = self.text, self._pos
+        while i < len(text):
+            ch = text[i]
+            i += 1
+            if not self._open:
+                if ch == "{":
+                    self._open.append(i - 1)
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                elif ch == "{":
+                    rest = text[i - 1:i + 31]
+                    if ":" not in rest and self._may_start_call(rest):
+                        i -= 1  # wait for more text to tell whether a call starts here
+                        break
+                    if self._CALL_START.match(rest):
+                        # An unescaped '{"name":' cannot sit inside a JSON
+                        # string, so the open block is not JSON: give it up.
+                        self._open = [i - 1]
+                        self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._open.append(i - 1)
+            elif ch == "}":
+                start = self._open.pop()
+                if any(self._CALL_START.match(text, s) for s in self._open):
+                    continue  # part of an enclosing call's arguments
+                call = self._parse(text[start:i])
+                if call:
+                    self.end = i
+                    found.append(call)
+                elif not self._open and self.end <= start:
+                    i = start + 1  # nothing found inside: rescan with fresh string state
+        self._pos = i
+        self.calls.extend(found)
+        return found
+
+    def more_calls_possible(self) -> bool:
+        """False once the output after the last call is clearly not another call."""
+        if self._open:
+            return True
+        return self._BETWEEN_CALLS.fullmatch(self.text, self.end) is not None
+
+    @staticmethod
+    def _may_start_call(rest: str) -> bool:
+        """Could `rest` ('{' plus what has streamed after it) still become '{"name":'?"""
+        head = rest[1:].lstrip()
+        key = head.rstrip()
+        if key != head:  # the key is complete
+            return key in ('"name"', '"arguments"')
+        return any(k.startswith(key) for k in ('"name"', '"arguments"'))
+
+    @staticmethod
+    def _parse(block: str):
         try:
-            r = requests.post(OLLAMA_URL, json=payload, timeout=60)
-            data = r.json()
-            return data.get("response", r.text)
-        except Exception as e:
-            log(f"⚠️ Ollama request failed (attempt {attempt+1}): {e}")
-            time.sleep(1)
-    return "[Error: Ollama request failed after retries]"
-
-# ----------------------------------------------------------------------
-# Helper: Call MCP tool
-# ----------------------------------------------------------------------
-def call_mcp_tool(tool: str, args: dict, max_retries=2) -> dict:
-    """Send a JSON-RPC request to the MCP server."""
-    payload = {
-        "jsonrpc": "2.0",
-        "id": str(int(time.time())),
-        "method": "mcp/call_tool",
-        "params": {"tool": tool, "arguments": args},
-    }
-    for attempt in range(max_retries):
+            j = json.loads(block)
+        except ValueError:
+            return None
+        if isinstance(j, dict) and "name" in j and "arguments" in j:
+            return j["name"], j["arguments"]
+        return None
+
+def result_text(response: dict) -> str:
+    """Text content of a JSON-RPC mcp/call_tool response."""
+    return response.get("result", {}).get("content", [{}])[0].get("text", "")
+
+def result_error(response: dict) -> str:
+    """Error message of a failed mcp/call_tool response, or ''."""
+    error = response.get("error") or ""
+    return error.get("message", "") if isinstance(error, dict) else str(error)
+
+def shed_wait(response: dict):
+    """Seconds to wait before retrying a shed call, or None if it wasn't shed."""
+    error = response.get("error")
+    if not isinstance(error, dict) or error.get("code") != MCP_OVERLOADED:
+        return None
+    return min(float((error.get("data") or {}).get("retry_after", 1)), MCP_MAX_RETRY_AFTER)
+
+# ----------------------------------------------------------------------
+# Conversation state
+# ----------------------------------------------------------------------
+class Conversation:
+    """
+    Message history for Ollama's /api/chat. The system prompt always stays
+    first and only the latest MAX_HISTORY_TURNS turns follow it, so each
+    request shares its prefix with the previous one and Ollama can reuse
+    the KV cache instead of re-processing the whole prompt. A turn is a
+    user message with the assistant replies and tool results after it,
+    and turns are dropped whole, so the history never starts mid-turn.
+    Once the window is full, every new turn drops the oldest one, and the
+    reusable prefix shrinks back to the system prompt.
+    """
+
+    def __init__(self, system_prompt: str = SYSTEM_INSTRUCTION,
+                 max_turns: int = MAX_HISTORY_TURNS):
+        self.system = {"role": "system", "content": system_prompt}
+        self.max_turns = max_turns
+        self.history: list[dict] = []
+
+    def add(self, role: str, content: str):
+        if role == "user":
+            starts = [i for i, m in enumerate(self.history) if m["role"] == "user"]
+            drop = len(starts) - self.max_turns + 1  # oldest turns to make room for this one
+            if drop > 0:
+                del self.history[:starts[drop] if drop < len(starts) else len(self.history)]
+        self.history.append({"role": role, "content": content})
+
+    def messages(self) -> list[dict]:
+        return [self.system] + self.history
+
+# ----------------------------------------------------------------------
+# Result rendering: local templates first, LLM summary as fallback
+# ----------------------------------------------------------------------
+# tool name -> renderer(text) returning the final answer, or None to fall
+# back to an LLM summary.
+RENDERERS: dict[str, Callable[[str], Optional[str]]] = {}
+MAX_FAST_PATH_CHARS = 2000
+
+WEATHER_RESULT = re.compile(
+    r"The current temperature in (?P<city>.+?) is (?P<temp>-?[\d.]+)°C "
+    r"with (?P<description>[^.]+)\.(?P<rain> Heavy rain expected\.)?"
+    r"(?: Carry an umbrella!)?(?: \((?P<stale>⚠️ [^)]*)\))?"
+)
+WEATHER_ERRORS = ("Error fetching weather", "Unable to fetch weather", "Unknown city",
+                  "Weather API key not found")
+
+def renderer(tool: str):
+    """Register a fast-path renderer for `tool`."""
+    def register(fn):
+        RENDERERS[tool] = fn
+        return fn
+    return register
+
+@renderer("get_weather")
+def render_weather(text: str) -> Optional[str]:
+    m = WEATHER_RESULT.match(text.strip())
+    if m:
+        answer = f"{m['city'].strip()}: {m['temp']}°C, {m['description']}."
+        if m["rain"]:
+            answer += " ☔ Rain expected — carry an umbrella!"
+        if m["stale"]:
+            answer += f" ({m['stale']})"
+        return answer
+    if text.startswith(WEATHER_ERRORS):
+        return text.strip()
+    return None
+
+@renderer("get_weather_bulk")
+def render_weather_bulk(text: str) -> Optional[str]:
+    lines = [line for line in text.splitlines() if line.strip()]
+    rendered = [render_weather(line) for line in lines]
+    if not lines or None in rendered:
+        return None
+    return "\n".join(rendered)
+
+@renderer("send_notification")
+def render_notification(text: str) -> Optional[str]:
+    return text.strip() or None
+
+# ----------------------------------------------------------------------
+# Client: pooled sessions for Ollama and the MCP server
+# ----------------------------------------------------------------------
+class ConnectorClient:
+    """
+    Owns one keep-alive requests.Session per endpoint, so every generate,
+    tool, notification and summary call reuses pooled connections instead
+    of opening new ones. Usable on its own or through chat_loop():
+
+        with ConnectorClient() as client:
+            conversation = Conversation()
+            text, tool, args = client.chat_ollama(conversation, "Weather in Pune?")
+            if tool:
+                print(client.call_mcp_tool(tool, args))
+    """
+
+    def __init__(self, ollama_url=OLLAMA_URL, ollama_chat_url=OLLAMA_CHAT_URL,
+                 mcp_url=MCP_URL, model=MODEL, pool_size=POOL_SIZE, renderers=None):
+        self.renderers = dict(RENDERERS if renderers is None else renderers)
+        self.ollama_url = ollama_url
+        self.ollama_chat_url = ollama_chat_url
+        self.mcp_url = mcp_url
+        self.model = model
+        self.ollama = self._session(pool_size)
+        self.mcp = self._session(pool_size)
+
+    @staticmethod
+    def _session(pool_size: int) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def close(self):
+        self.ollama.close()
+        self.mcp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ------------------------------------------------------------------
+    # Ollama
+    # ------------------------------------------------------------------
+    def ask_ollama(self, prompt: str, max_retries=3) -> str:
+        """Send a stateless prompt to Ollama, retry on failure."""
+        payload = {"model": self.model, "prompt": prompt, "stream": False}
+        with tracing.span("llm.generate", kind=tracing.CLIENT,
+                          attributes={"gen_ai.request.model": self.model, "llm.endpoint": "generate"}):
+            for attempt in range(max_retries):
+                try:
+                    r = self.ollama.post(self.ollama_url, json=payload, timeout=60,
+                                         headers=tracing.inject({}))
+                    data = r.json()
+                    return data.get("response", r.text)
+                except Exception as e:
+                    log(f"⚠️ Ollama request failed (attempt {attempt+1}): {e}")
+                    time.sleep(1)
+            return "[Error: Ollama request failed after retries]"
+
+    def prefill(self, conversation: Conversation):
+        """Load the model and process the system prompt once, up front."""
+        payload = {
+            "model": self.model, "messages": [conversation.system], "stream": False,
+            "keep_alive": KEEP_ALIVE, "options": {"num_predict": 1},
+        }
+        self.ollama.post(self.ollama_chat_url, json=payload, timeout=120)
+
+    def chat_ollama(self, conversation: Conversation, user_input: str,
+                    stream=STREAM_RESPONSES, max_retries=3):
+        """
+        Send the user's turn with the conversation history and extract its
+        tool calls. Returns (text, [(tool, args), ...]) and records the reply
+        in the history. When streaming, the stream is closed as soon as the
+        output after the last complete call cannot be another call, which
+        stops Ollama generating the rest.
+        """
+        conversation.add("user", user_input)
+        payload = {
+            "model": self.model, "messages": conversation.messages(),
+            "stream": stream, "keep_alive": KEEP_ALIVE,
+        }
+        attributes = {"gen_ai.request.model": self.model, "llm.endpoint": "chat", "llm.stream": stream}
+        with tracing.span("llm.generate", kind=tracing.CLIENT, attributes=attributes) as span:
+            for attempt in range(max_retries):
+                try:
+                    if stream:
+                        text, calls = self._stream_chat(payload)
+                    else:
+                        r = self.ollama.post(self.ollama_chat_url, json=payload, timeout=60,
+                                             headers=tracing.inject({}))
+                        text = r.json().get("message", {}).get("content", r.text)
+                        with tracing.span("tool.detect") as detect:
+                            calls = extract_tool_calls(text)
+                            detect.set_attribute("tool.calls", len(calls))
+                    conversation.add("assistant", text)
+                    span.set_attribute("tool.calls", len(calls))
+                    return text, calls
+                except Exception as e:
+                    log(f"⚠️ Ollama chat failed (attempt {attempt+1}): {e}")
+                    span.set_attribute("llm.failed_attempts", attempt + 1)
+                    time.sleep(1)
+            span.record_error("Ollama request failed after retries")
+        conversation.history.pop()  # keep the history free of unanswered turns
+        return "[Error: Ollama request failed after retries]", []
+
+    def _stream_chat(self, payload: dict):
+        """
+        Stream the reply; the tool.detect span runs from the request until
+        the first complete tool call (or the end of the stream).
+        """
+        detector = ToolCallDetector()
+        detect = tracing.start_span("tool.detect")
         try:
-            r = requests.post(MCP_URL, json=payload, timeout=60)
-            if r.status_code == 200:
-                return r.json()
-            else:
-                log(f"⚠️ MCP call failed (HTTP {r.status_code}): {r.text[:200]}")
-        except Exception as e:
-            log(f"⚠️ MCP call exception: {e}")
-            time.sleep(1)
-    return {"error": f"MCP call failed for {tool}"}
+            with self.ollama.post(self.ollama_chat_url, json=payload, stream=True, timeout=60,
+                                  headers=tracing.inject({})) as r:
+                for line in r.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if detector.feed(chunk.get("message", {}).get("content", "")):
+                        detect.set_attribute("tool.calls", len(detector.calls))
+                        detect.end()
+                    if detector.calls and not detector.more_calls_possible():
+                        return detector.text[:detector.end], detector.calls
+                    if chunk.get("done"):
+                        break
+            return detector.text, detector.calls
+        finally:
+            if not detector.calls:
+                detect.set_attribute("tool.calls", 0)
+            detect.end()
+
+    def render_result(self, tool: str, text: str) -> str:
+        """
+        Final answer for a tool result: a registered renderer when it
+        recognises the output, otherwise a one-line LLM summary.
+        """
+        render = self.renderers.get(tool)
+        if render and len(text) <= MAX_FAST_PATH_CHARS:
+            answer = render(text)
+            if answer:
+                return answer
+        return self.ask_ollama(f"Summarize in one line, clearly and concisely: {text}")
+
+    # ------------------------------------------------------------------
+    # MCP server
+    # ------------------------------------------------------------------
+    def call_mcp_tool(self, tool: str, args: dict, max_retries=2) -> dict:
+        """Send a JSON-RPC request to the MCP server."""
+        with tracing.span("mcp.call_tool", kind=tracing.CLIENT, attributes={"mcp.tool": tool}) as span:
+            payload = {
+                "jsonrpc": "2.0",
+                "id": str(int(time.time())),
+                "method": "mcp/call_tool",
+                "params": tracing.inject_meta({"tool": tool, "arguments": args}),
+            }
+            r = None
+            for attempt in range(max_retries):
+                try:
+                    r = self.mcp.post(self.mcp_url, json=payload, timeout=60,
+                                      headers=tracing.inject({}))
+                    if r.status_code == 200:
+                        return r.json()
+                    if r.status_code == 503 and "Retry-After" in r.headers:
+                        if attempt + 1 == max_retries:
+                            break  # still shed; report the server's error
+                        wait = min(float(r.headers["Retry-After"]), MCP_MAX_RETRY_AFTER)
+                        log(f"⏳ MCP server overloaded, retrying in {wait:g}s")
+                        time.sleep(wait)
+                        continue
+                    log(f"⚠️ MCP call failed (HTTP {r.status_code}): {r.text[:200]}")
+                except Exception as e:
+                    log(f"⚠️ MCP call exception: {e}")
+                    time.sleep(1)
+            span.record_error(f"MCP call failed for {tool}")
+            if r is not None and r.status_code == 503:
+                try:
+                    return r.json()
+                except ValueError:
+                    pass
+            return {"error": f"MCP call failed for {tool}"}
+
+    def call_mcp_tools(self, calls: list, max_retries=2) -> list[dict]:
+        """
+        Run several independent tool calls in one JSON-RPC batch; the server
+        executes them concurrently. Returns one response per call, in order.
+        Calls the server shed (-32001) are re-sent on their own after their
+        retry_after, up to max_retries attempts in all.
+        """
+        if len(calls) == 1:
+            return [self.call_mcp_tool(*calls[0], max_retries=max_retries)]
+        stamp = int(time.time())
+        with tracing.span("mcp.batch", kind=tracing.CLIENT, attributes={"mcp.calls": len(calls)}) as span:
+            batch = [
+                {
+                    "jsonrpc": "2.0",
+                    "id": f"{stamp}-{i}",
+                    "method": "mcp/call_tool",
+                    "params": tracing.inject_meta({"tool": tool, "arguments": args}),
+                }
+                for i, (tool, args) in enumerate(calls)
+            ]
+            by_id: dict = {}
+            pending = batch
+            for attempt in range(max_retries):
+                try:
+                    r = self.mcp.post(self.mcp_url, json=pending, timeout=60,
+                                      headers=tracing.inject({}))
+                    if r.status_code == 200 and isinstance(r.json(), list):
+                        by_id.update((resp.get("id"), resp) for resp in r.json())
+                        waits = [shed_wait(by_id.get(req["id"], {})) for req in pending]
+                        pending = [req for req, w in zip(pending, waits) if w is not None]
+                        if not pending or attempt + 1 == max_retries:
+                            break
+                        wait = max(w for w in waits if w is not None)
+                        log(f"⏳ MCP server shed {len(pending)} call(s), retrying in {wait:g}s")
+                        time.sleep(wait)
+                        continue
+                    log(f"⚠️ MCP batch failed (HTTP {r.status_code}): {r.text[:200]}")
+                except Exception as e:
+                    log(f"⚠️ MCP batch exception: {e}")
+                    time.sleep(1)
+            if pending:
+                span.record_error("MCP batch failed")
+            return [
+                by_id.get(req["id"], {"error": f"MCP call failed for {tool}"})
+                for req, (tool, _) in zip(batch, calls)
+            ]
 
 # ----------------------------------------------------------------------
-# Helper: Detect JSON tool calls
+# Background alert delivery
 # ----------------------------------------------------------------------
-def detect_tool_call(text: str):
-    """Detect valid JSON tool call blocks."""
-    json_block = re.search(r"\{[\s\S]*?\}", text)
-    if json_block:
+class NotificationDispatcher:
+    """
+    Delivers alert notifications from a background thread so a chat turn
+    never waits on ntfy. Failed sends are retried with exponential backoff
+    and every outcome is logged when it happens, not in the user's turn.
+    """
+
+    def __init__(self, mcp_url=MCP_URL, max_attempts=NOTIFY_MAX_ATTEMPTS,
+                 backoff=NOTIFY_BACKOFF_SECONDS, queue_size=NOTIFY_QUEUE_SIZE):
+        # Own client: requests sessions should not be shared across threads.
+        self.client = ConnectorClient(mcp_url=mcp_url, pool_size=1)
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name="alert-dispatcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, notification_input: str) -> bool:
+        """Queue a 'message|topic' notification; False if the queue is full."""
         try:
-            j = json.loads(json_block.group(0))
-            if "name" in j and "arguments" in j:
-                return j["name"], j["arguments"]
-        except Exception:
-            pass
-    return None, None
+            # The worker thread has its own context: hand over the current span.
+            self._queue.put_nowait((notification_input, tracing.current()))
+            return True
+        except queue.Full:
+            log("⚠️ Notification queue full — alert dropped.")
+            return False
+
+    def close(self, timeout=5.0):
+        """Stop after the queued notifications have been attempted."""
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self.client.close()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            notification_input, parent = item
+            try:
+                with tracing.span("notify.deliver", parent=parent):
+                    self._deliver(notification_input)
+            except Exception as e:
+                log(f"❌ Notification worker error: {e}")
+
+    def _deliver(self, notification_input: str):
+        text = ""
+        for attempt in range(self.max_attempts):
+            response = self.client.call_mcp_tool(
+                "send_notification", {"notification_input": notification_input}, max_retries=1
+            )
+            text = result_text(response) or response.get("error", "")
+            if text and not text.startswith(("❌", "Error", "Invalid", "MCP call failed")):
+                log(f"🔔 Notification: {text}")
+                return
+            if attempt + 1 < self.max_attempts:
+                time.sleep(self.backoff * 2 ** attempt)
+        log(f"❌ Notification failed after {self.max_attempts} attempts: {text}")
 
 # ----------------------------------------------------------------------
 # Chat loop
 # ----------------------------------------------------------------------
-def chat_loop():
+def handle_turn(client: ConnectorClient, conversation: Conversation,
+                notifier: NotificationDispatcher, user_input: str):
+    """One user turn: generate, run the tool calls, print the answers."""
+    # The system prompt stays in the conversation, so no per-turn reminder
+    model_output, calls = client.chat_ollama(conversation, user_input)
+    print(f"\n💬 Ollama:\n{model_output}\n")
+
+    # Fallback detection for weather or notification
+    if not calls:
+        if "weather" in user_input.lower():
+            log("⚙️ Model ignored rule; forcing get_weather tool call.")
+            city_match = re.findall(r"in\s+([A-Za-z ,]+)", user_input)
+            cities = re.split(r"\s*(?:,|\band\b)\s*", city_match[0]) if city_match else []
+            cities = [c.strip() for c in cities if c.strip()] or [DEFAULT_CITY]
+            calls = [("get_weather", {"city": city}) for city in cities]
+        elif "notify" in user_input.lower() or "alert" in user_input.lower():
+            log("⚙️ Forcing send_notification tool call.")
+            calls = [("send_notification", {
+                "notification_input": f"{user_input}|general_alerts"
+            })]
+
+    # If still no tool
+    if not calls:
+        log("⚙️ No tool call detected.\n")
+        return
+
+    for tool, args in calls:
+        log(f"🧰 Tool Detected: {tool} with args {args}")
+    # Independent calls go out together as one JSON-RPC batch
+    responses = client.call_mcp_tools(calls)
+
+    for (tool, args), mcp_response in zip(calls, responses):
+        text = result_text(mcp_response)
+        if not text:
+            error = result_error(mcp_response)
+            if error:
+                print(f"⚠️ {tool} failed: {error}\n")
+            else:
+                log(f"⚠️ Empty MCP result received for {tool}.")
+            continue
+
+        print(f"🧮 MCP result: {text}\n")
+        conversation.add("tool", text)
+
+        # Rain/Drizzle Notification Trigger
+        if tool == "get_weather":
+            lower_text = text.lower()
+            if any(k in lower_text for k in ALERT_KEYWORDS):
+                log("☔ Weather alert detected — notification queued.")
+                notifier.submit(f"{text}|weather_alerts")
+
+        # Render locally when possible, otherwise summarize with the LLM
+        summary = client.render_result(tool, text)
+        print(f"💡 Final Answer:\n{summary}\n")
+
+def chat_loop(client: ConnectorClient = None):
     print("\n🤖 Ollama + MCP Connector (Enhanced Mode)")
     print("💡 Type 'exit' to quit.\n")
 
-    system_instruction = (
-        "SYSTEM INSTRUCTION:\n"
-        "You are an AI assistant connected to a local MCP server.\n"
-        "You cannot write or show code.\n"
-        "You must call tools for all external actions.\n"
-        "Available tools:\n"
-        "1. get_weather(city: string)\n"
-        "2. send_notification(notification_input: string)\n"
-        "Always respond ONLY in JSON format like:\n"
-        "{ \"name\": \"<tool_name>\", \"arguments\": { ... } }\n"
-    )
-    ask_ollama(system_instruction)
-    log("✅ System prompt initialized.\n")
+    owns_client = client is None
+    client = client or ConnectorClient()
+    conversation = Conversation(SYSTEM_INSTRUCTION)
+    notifier = NotificationDispatcher(client.mcp_url)
+    try:
+        client.prefill(conversation)
+        log("✅ System prompt initialized.\n")
+    except Exception as e:
+        log(f"⚠️ System prompt prefill failed: {e}")
 
     while True:
         try:
@@ -112,68 +653,8 @@ def chat_loop():
                 print("👋 Goodbye!")
                 break
 
-            # Reinforce instruction each turn
-            enforced_input = (
-                f"Reminder: Never show code. Use MCP tools only.\n\nUser request: {user_input}"
-            )
-            model_output = ask_ollama(enforced_input)
-            print(f"\n💬 Ollama:\n{model_output}\n")
-
-            tool, args = detect_tool_call(model_output)
-
-            # Fallback detection for weather or notification
-            if not tool:
-                if "weather" in user_input.lower():
-                    log("⚙️ Model ignored rule; forcing get_weather tool call.")
-                    city_match = re.findall(r"in\s+([A-Za-z ]+)", user_input)
-                    city = city_match[0].strip() if city_match else DEFAULT_CITY
-                    tool, args = "get_weather", {"city": city}
-                elif "notify" in user_input.lower() or "alert" in user_input.lower():
-                    log("⚙️ Forcing send_notification tool call.")
-                    tool, args = "send_notification", {
-                        "notification_input": f"{user_input}|general_alerts"
-                    }
-
-            # If still no tool
-            if not tool:
-                log("⚙️ No tool call detected.\n")
-                continue
-
-            log(f"🧰 Tool Detected: {tool} with args {args}")
-            mcp_response = call_mcp_tool(tool, args)
-
-            text = (
-                mcp_response.get("result", {})
-                .get("content", [{}])[0]
-                .get("text", "")
-            )
-            if not text:
-                log("⚠️ Empty MCP result received.")
-                continue
-
-            print(f"🧮 MCP result: {text}\n")
-
-            # Rain/Drizzle Notification Trigger
-            if tool == "get_weather":
-                lower_text = text.lower()
-                if any(k in lower_text for k in ALERT_KEYWORDS):
-                    log("☔ Weather alert detected — sending notification.")
-                    notif_input = f"{text}|weather_alerts"
-                    notif_result = call_mcp_tool(
-                        "send_notification",
-                        {"notification_input": notif_input},
-                    )
-                    notif_text = (
-                        notif_result.get("result", {})
-                        .get("content", [{}])[0]
-                        .get("text", "")
-                    )
-                    log(f"🔔 Notification: {notif_text}\n")
-
-            # Summarize result for user
-            summary_prompt = f"Summarize in one line, clearly and concisely: {text}"
-            summary = ask_ollama(summary_prompt)
-            print(f"💡 Final Answer:\n{summary}\n")
+            with tracing.span("chat.turn", attributes={"gen_ai.request.model": client.model}):
+                handle_turn(client, conversation, notifier, user_input)
 
         except KeyboardInterrupt:
             print("\n👋 Session ended by user.")
@@ -182,6 +663,10 @@ def chat_loop():
             log(f"❌ Unexpected error: {e}")
             continue
 
+    notifier.close()
+    if owns_client:
+        client.close()
+
 # ----------------------------------------------------------------------
 if __name__ == "__main__":
     chat_loop()
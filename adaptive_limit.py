@@ -0,0 +1,129 @@
+"""
+Adaptive Concurrency Limit
+--------------------------
+AIMD limiter in front of tool dispatch, so overload turns into fast
+rejections instead of unbounded queueing.
+- The limit grows by ~1 per limit's worth of calls completed on time while
+  at least a quarter of it is in use (additive increase), and shrinks by
+  LIMIT_BACKOFF when a call is slow while at least half of it is in use
+  (multiplicative decrease), at most once per round trip
+- "Slow" is relative to a per-tool baseline: above LIMIT_TOLERANCE x the
+  tool's running p90 latency and above LIMIT_MIN_LATENCY. A p90 rather
+  than a mean, so a tool mixing cache hits and upstream calls is judged
+  against its upstream calls
+- Priorities share the limit unevenly: lower priorities are shed first,
+  leaving headroom for cheap, important calls; "critical" is never limited
+- Rejections carry a retry-after hint derived from the baseline latency
+
+Not thread-safe by design: it relies on mcp_server.py's single serving loop.
+
+Environment:
+    LIMIT_ENABLED        1 / 0                                  (default 1)
+    LIMIT_INITIAL        starting limit                         (default 32)
+    LIMIT_MIN            floor for the limit                    (default 4)
+    LIMIT_MAX            ceiling for the limit                  (default 512)
+    LIMIT_BACKOFF        multiplier applied on a slow call      (default 0.9)
+    LIMIT_TOLERANCE      slow = latency > tolerance x baseline  (default 2.0)
+    LIMIT_MIN_LATENCY    seconds never considered slow          (default 0.25)
+"""
+
+import math
+import os
+import time
+
+LIMIT_ENABLED = os.getenv("LIMIT_ENABLED", "1") not in ("0", "false", "no")
+LIMIT_INITIAL = float(os.getenv("LIMIT_INITIAL", "32"))
+LIMIT_MIN = float(os.getenv("LIMIT_MIN", "4"))
+LIMIT_MAX = float(os.getenv("LIMIT_MAX", "512"))
+LIMIT_BACKOFF = float(os.getenv("LIMIT_BACKOFF", "0.9"))
+LIMIT_TOLERANCE = float(os.getenv("LIMIT_TOLERANCE", "2.0"))
+LIMIT_MIN_LATENCY = float(os.getenv("LIMIT_MIN_LATENCY", "0.25"))
+
+# Share of the limit each priority may fill before it is shed.
+PRIORITY_SHARE = {"critical": math.inf, "high": 1.0, "normal": 0.8, "low": 0.5}
+
+# Baseline quantile and step: each sample moves the estimate by a few percent
+# in log space, up when the sample is above it and down when below, which
+# settles where BASELINE_QUANTILE of samples are below.
+BASELINE_QUANTILE = 0.9
+BASELINE_STEP = 0.05
+BASELINE_FLOOR = 0.0005  # seconds; keeps log steps meaningful for instant calls
+
+class Overloaded(Exception):
+    """The call was shed; try again after `retry_after` seconds."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Server overloaded, retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+class AdaptiveLimiter:
+    def __init__(self, initial: float = LIMIT_INITIAL, min_limit: float = LIMIT_MIN,
+                 max_limit: float = LIMIT_MAX, backoff: float = LIMIT_BACKOFF,
+                 tolerance: float = LIMIT_TOLERANCE, min_latency: float = LIMIT_MIN_LATENCY,
+                 enabled: bool = LIMIT_ENABLED, clock=time.monotonic):
+        self.limit = initial
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.min_latency = min_latency
+        self.enabled = enabled
+        self._clock = clock
+        self.in_flight = 0
+        self.baselines: dict[str, float] = {}  # key (tool) -> p90 latency estimate, seconds
+        self.rejected = 0
+        self._last_decrease = 0.0
+
+    def acquire(self, priority: str = "normal", key: str = "") -> float:
+        """Admit a call or raise Overloaded; returns the start time for release()."""
+        share = PRIORITY_SHARE.get(priority, PRIORITY_SHARE["normal"])
+        if self.enabled and self.in_flight >= self.limit * share:
+            self.rejected += 1
+            raise Overloaded(self.retry_after(key))
+        self.in_flight += 1
+        return self._clock()
+
+    def release(self, started: float, dropped: bool = False, key: str = ""):
+        """
+        Record a finished call of `key`. `dropped` calls (errors) release
+        the slot without moving the limit either way.
+        """
+        in_flight = self.in_flight
+        self.in_flight -= 1
+        if dropped:
+            return
+        now = self._clock()
+        latency = now - started
+        baseline = self.baselines.get(key)
+        if baseline is None:
+            # Start high rather than at a first sample that may be a cache hit.
+            baseline = max(latency, self.min_latency)
+        self.baselines[key] = max(BASELINE_FLOOR, baseline * math.exp(
+            BASELINE_STEP * (BASELINE_QUANTILE if latency > baseline else BASELINE_QUANTILE - 1)
+        ))
+
+        if latency > max(self.min_latency, self.tolerance * baseline):
+            # Only while the limit is what bounds concurrency: with most of
+            # it unused, the latency is the upstream's, not ours. And once
+            # per round trip of the slow call, so calls queued behind the
+            # same congestion do not shrink it again.
+            if in_flight >= self.limit / 2 and now - self._last_decrease >= latency:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self._last_decrease = now
+        elif in_flight >= self.limit / 4:
+            # Grow before the lowest priority's share is reached, so steady
+            # load below capacity is not shed at its peaks.
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def retry_after(self, key: str = "") -> float:
+        """Seconds until capacity is likely to be free again."""
+        return max(1.0, 2 * self.baselines.get(key, 0.0))
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "baseline_latency_s": {key: round(b, 4) for key, b in self.baselines.items()},
+            "rejected": self.rejected,
+        }
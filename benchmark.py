@@ -0,0 +1,267 @@
+"""
+MCP Benchmark
+-------------
+Load test for the /mcp endpoint, fully offline.
+- Starts mock_upstreams.py (OpenWeatherMap, ntfy, Ollama) and mcp_server.py
+  as subprocesses, the server pointed at the mocks; MOCK_* variables shape
+  upstream latency, errors and rate limits (see mock_upstreams.py)
+- Drives a fixed number of concurrent clients for a fixed duration per
+  scenario: mcp/call_tool, mcp/list_tools and JSON-RPC batches
+- Reports throughput and p50/p95/p99 latency per scenario
+- Appends machine-readable results, tagged with the git commit, to a JSONL
+  file so runs can be compared across commits
+
+Run:
+    python benchmark.py                                  # all scenarios, asgi mode
+    python benchmark.py --mode flask --concurrency 8 --duration 5
+    python benchmark.py --scenario call_tool --url http://localhost:9000/mcp
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BENCH_RESULTS_PATH = os.getenv("BENCH_RESULTS_PATH", "benchmark_results.jsonl")
+BENCH_CITIES = ["Chennai", "London", "Tokyo", "Paris", "Berlin", "Sydney", "Toronto", "Cairo",
+                "Lima", "Oslo", "Delhi", "Madrid", "Rome", "Seoul", "Nairobi", "Dubai"]
+SERVER_STARTUP_TIMEOUT = 20.0
+
+# --------------------------------------------------------------------
+# Processes: mock upstreams + server under test
+# --------------------------------------------------------------------
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_mocks(port: int) -> subprocess.Popen:
+    """mock_upstreams.py in its own process, configured by the MOCK_* environment."""
+    return subprocess.Popen(
+        [sys.executable, os.path.join(HERE, "mock_upstreams.py"), "--port", str(port)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+def start_mcp_server(mode: str, port: int, upstream: str, workdir: str) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "OPENWEATHER_BASE_URL": upstream,
+        "NTFY_BASE_URL": upstream,
+        "WEATHER_API_KEY": os.getenv("WEATHER_API_KEY", "benchmark"),
+        "NOTIFY_DB_PATH": os.path.join(workdir, "notifications.db"),
+        "CITY_INDEX_PATH": os.getenv("CITY_INDEX_PATH", ""),
+    }
+    return subprocess.Popen(
+        [sys.executable, os.path.join(HERE, "mcp_server.py"),
+         "--mode", mode, "--host", "127.0.0.1", "--port", str(port)],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+def wait_until_up(url: str, process: subprocess.Popen):
+    """Poll `url` until it answers 200; fail early if `process` dies."""
+    deadline = time.monotonic() + SERVER_STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{process.args[1]} exited with code {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"{url} not up after {SERVER_STARTUP_TIMEOUT:.0f}s")
+
+def stop(process: subprocess.Popen):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+# --------------------------------------------------------------------
+# Scenarios: each returns the next JSON-RPC payload to send
+# --------------------------------------------------------------------
+def call_tool_payloads(cities: list[str]):
+    for i, city in enumerate(itertools.cycle(cities)):
+        yield {"jsonrpc": "2.0", "id": i, "method": "mcp/call_tool",
+               "params": {"tool": "get_weather", "arguments": {"city": city}}}
+
+def list_tools_payloads():
+    for i in itertools.count():
+        yield {"jsonrpc": "2.0", "id": i, "method": "mcp/list_tools"}
+
+def batch_payloads(cities: list[str], size: int):
+    requests = call_tool_payloads(cities)
+    while True:
+        yield [next(requests) for _ in range(size)]
+
+SCENARIOS = ("call_tool", "list_tools", "batch")
+
+def scenario_payloads(name: str, cities: list[str], batch_size: int):
+    if name == "call_tool":
+        return call_tool_payloads(cities)
+    if name == "list_tools":
+        return list_tools_payloads()
+    return batch_payloads(cities, batch_size)
+
+def is_error(status: int, body) -> bool:
+    if status != 200:
+        return True
+    replies = body if isinstance(body, list) else [body]
+    return any("error" in reply for reply in replies)
+
+# --------------------------------------------------------------------
+# Load generator
+# --------------------------------------------------------------------
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+async def run_scenario(mcp_url: str, name: str, payloads, concurrency: int,
+                       duration: float, warmup: float, calls_per_request: int = 1) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=30.0) as client:
+        start = time.perf_counter()
+        measure_from = start + warmup
+        stop_at = measure_from + duration
+
+        async def worker():
+            nonlocal errors
+            while True:
+                sent = time.perf_counter()
+                if sent >= stop_at:
+                    return
+                try:
+                    response = await client.post(mcp_url, json=next(payloads))
+                    failed = is_error(response.status_code, response.json())
+                except (httpx.HTTPError, ValueError):
+                    failed = True
+                if sent >= measure_from:
+                    latencies.append(time.perf_counter() - sent)
+                    errors += failed
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    latencies.sort()
+    ms = [v * 1000 for v in latencies]
+    return {
+        "scenario": name,
+        "requests": len(latencies),
+        "errors": errors,
+        "duration_s": duration,
+        "throughput_rps": round(len(latencies) / duration, 1),
+        "calls_per_s": round(len(latencies) * calls_per_request / duration, 1),
+        "latency_ms": {
+            "p50": round(percentile(ms, 50), 2),
+            "p95": round(percentile(ms, 95), 2),
+            "p99": round(percentile(ms, 99), 2),
+            "max": round(ms[-1], 2) if ms else 0.0,
+            "mean": round(sum(ms) / len(ms), 2) if ms else 0.0,
+        },
+    }
+
+# --------------------------------------------------------------------
+# Results
+# --------------------------------------------------------------------
+def git_commit() -> dict:
+    def git(*args) -> str:
+        try:
+            return subprocess.run(["git", *args], cwd=HERE, capture_output=True,
+                                  text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return ""
+    return {"sha": git("rev-parse", "HEAD") or None, "dirty": bool(git("status", "--porcelain"))}
+
+def print_report(results: list[dict]):
+    print(f"{'scenario':<12}{'req/s':>10}{'calls/s':>10}{'p50 ms':>10}{'p95 ms':>10}"
+          f"{'p99 ms':>10}{'errors':>8}")
+    for r in results:
+        lat = r["latency_ms"]
+        print(f"{r['scenario']:<12}{r['throughput_rps']:>10}{r['calls_per_s']:>10}{lat['p50']:>10}"
+              f"{lat['p95']:>10}{lat['p99']:>10}{r['errors']:>8}")
+
+async def run_benchmark(cli, mcp_url: str) -> list[dict]:
+    cities = BENCH_CITIES[:cli.cities] if cli.cities else BENCH_CITIES
+    results = []
+    for name in cli.scenario or SCENARIOS:
+        payloads = scenario_payloads(name, cities, cli.batch_size)
+        print(f"▶ {name}: {cli.concurrency} clients for {cli.duration:g}s ...")
+        results.append(await run_scenario(
+            mcp_url, name, payloads, cli.concurrency, cli.duration, cli.warmup,
+            calls_per_request=cli.batch_size if name == "batch" else 1,
+        ))
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the MCP /mcp endpoint.")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS,
+                        help="scenario to run (repeatable; default: all)")
+    parser.add_argument("--mode", choices=["asgi", "flask"], default="asgi")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds measured per scenario")
+    parser.add_argument("--warmup", type=float, default=2.0, help="unmeasured seconds per scenario")
+    parser.add_argument("--batch-size", type=int, default=10)
+    parser.add_argument("--cities", type=int, default=0,
+                        help=f"distinct cities to cycle through (default: all {len(BENCH_CITIES)})")
+    parser.add_argument("--url", help="benchmark an already running /mcp endpoint instead")
+    parser.add_argument("--output", default=BENCH_RESULTS_PATH, help="JSONL file results are appended to")
+    cli = parser.parse_args()
+
+    processes = []
+    upstream_stats = None
+    with tempfile.TemporaryDirectory(prefix="mcp-bench-") as workdir:
+        try:
+            if cli.url:
+                mcp_url = cli.url
+            else:
+                mock_port, server_port = free_port(), free_port()
+                mocks_url = f"http://127.0.0.1:{mock_port}"
+                processes.append(start_mocks(mock_port))
+                wait_until_up(f"{mocks_url}/_stats", processes[-1])
+                processes.append(start_mcp_server(cli.mode, server_port, mocks_url, workdir))
+                wait_until_up(f"http://127.0.0.1:{server_port}/health", processes[-1])
+                mcp_url = f"http://127.0.0.1:{server_port}/mcp"
+            results = asyncio.run(run_benchmark(cli, mcp_url))
+            if not cli.url:
+                upstream_stats = httpx.get(f"{mocks_url}/_stats").json()
+        finally:
+            for process in reversed(processes):
+                stop(process)
+
+    print_report(results)
+    record = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "config": {
+            "mode": None if cli.url else cli.mode,
+            "url": cli.url,
+            "concurrency": cli.concurrency,
+            "duration_s": cli.duration,
+            "warmup_s": cli.warmup,
+            "batch_size": cli.batch_size,
+            "cities": cli.cities or len(BENCH_CITIES),
+            "mocks": {k: v for k, v in sorted(os.environ.items()) if k.startswith("MOCK_")},
+        },
+        "results": results,
+        "upstream_stats": upstream_stats,
+    }
+    with open(cli.output, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+    print(f"✅ Results appended to {cli.output}")
@@ -0,0 +1,176 @@
+"""
+Circuit Breaker
+---------------
+Per-upstream breaker used by http_client.py, so an upstream that is down
+or crawling costs callers nothing instead of a timeout each.
+- closed: calls pass; outcomes are kept for a rolling BREAKER_WINDOW
+- open: once the window holds BREAKER_MIN_CALLS calls and the failure rate
+  or the slow-call rate reaches its threshold, calls fail fast with
+  CircuitOpen for BREAKER_OPEN_SECONDS
+- half-open: then up to BREAKER_HALF_OPEN_CALLS trial calls go through;
+  if they all succeed the breaker closes, any failure opens it again
+- A failure is a transport error, HTTP 5xx or 429; a slow call is one
+  slower than BREAKER_SLOW_CALL_SECONDS, whatever its outcome
+
+Lock-free; see the serving event loop note in mcp_server.py.
+
+Environment:
+    BREAKER_ENABLED              1 / 0                                 (default 1)
+    BREAKER_WINDOW               seconds of outcomes considered        (default 30)
+    BREAKER_MIN_CALLS            calls in the window before tripping   (default 10)
+    BREAKER_FAILURE_RATE         failure share that opens the breaker  (default 0.5)
+    BREAKER_SLOW_CALL_SECONDS    latency counted as slow               (default 5)
+    BREAKER_SLOW_CALL_RATE       slow share that opens the breaker     (default 0.8)
+    BREAKER_OPEN_SECONDS         time open before trial calls          (default 30)
+    BREAKER_HALF_OPEN_CALLS      trial calls needed to close again     (default 3)
+"""
+
+import logging
+import os
+import time
+from collections import deque
+
+BREAKER_ENABLED = os.getenv("BREAKER_ENABLED", "1") not in ("0", "false", "no")
+BREAKER_WINDOW = float(os.getenv("BREAKER_WINDOW", "30"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "10"))
+BREAKER_FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_SLOW_CALL_SECONDS = float(os.getenv("BREAKER_SLOW_CALL_SECONDS", "5"))
+BREAKER_SLOW_CALL_RATE = float(os.getenv("BREAKER_SLOW_CALL_RATE", "0.8"))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+BREAKER_HALF_OPEN_CALLS = int(os.getenv("BREAKER_HALF_OPEN_CALLS", "3"))
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}  # for the state gauge
+
+class CircuitOpen(Exception):
+    """The upstream's breaker is open; nothing was sent."""
+
+    def __init__(self, upstream: str, retry_after: float):
+        super().__init__(f"{upstream} is unavailable (circuit open, retry in {retry_after:.0f}s)")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+def is_failure(status) -> bool:
+    """Outcome classification: 'error' (no response), 5xx and 429 count against the upstream."""
+    return not isinstance(status, int) or status >= 500 or status == 429
+
+class CircuitBreaker:
+    def __init__(self, name: str, window: float = BREAKER_WINDOW, min_calls: int = BREAKER_MIN_CALLS,
+                 failure_rate: float = BREAKER_FAILURE_RATE,
+                 slow_call_seconds: float = BREAKER_SLOW_CALL_SECONDS,
+                 slow_call_rate: float = BREAKER_SLOW_CALL_RATE,
+                 open_seconds: float = BREAKER_OPEN_SECONDS,
+                 half_open_calls: int = BREAKER_HALF_OPEN_CALLS,
+                 enabled: bool = BREAKER_ENABLED, clock=time.monotonic):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.enabled = enabled
+        self._clock = clock
+        self.state = CLOSED
+        self.opened_at = 0.0
+        # (finished_at, failed, slow) per call, with running totals.
+        self._outcomes: deque = deque()
+        self._failures = 0
+        self._slow = 0
+        self._trials = 0  # half-open calls admitted
+        self._trial_successes = 0
+        self.rejected = 0
+        self.opened = 0
+
+    def before_call(self):
+        """Admit a call or raise CircuitOpen."""
+        if not self.enabled or self.state == CLOSED:
+            return
+        now = self._clock()
+        if self.state == OPEN:
+            remaining = self.opened_at + self.open_seconds - now
+            if remaining > 0:
+                self.rejected += 1
+                raise CircuitOpen(self.name, remaining)
+            self._transition(HALF_OPEN)
+        if self._trials >= self.half_open_calls:
+            self.rejected += 1
+            raise CircuitOpen(self.name, self.open_seconds)
+        self._trials += 1
+
+    def after_call(self, status, latency: float):
+        """Record a finished call: `status` is the HTTP status, or 'error'."""
+        if not self.enabled:
+            return
+        failed = is_failure(status)
+        slow = latency > self.slow_call_seconds
+        if self.state == HALF_OPEN:
+            if failed or slow:
+                self._trip()
+            else:
+                self._trial_successes += 1
+                if self._trial_successes >= self.half_open_calls:
+                    self._transition(CLOSED)
+            return
+        if self.state == OPEN:
+            return  # admitted before the breaker opened; already decided
+
+        now = self._clock()
+        self._outcomes.append((now, failed, slow))
+        self._failures += failed
+        self._slow += slow
+        self._expire(now)
+        calls = len(self._outcomes)
+        if calls >= self.min_calls and (self._failures / calls >= self.failure_rate
+                                        or self._slow / calls >= self.slow_call_rate):
+            self._trip()
+
+    def cancel_call(self):
+        """A call that ended without an outcome (cancelled) frees its trial slot."""
+        if self.enabled and self.state == HALF_OPEN and self._trials > 0:
+            self._trials -= 1
+
+    def _expire(self, now: float):
+        outcomes = self._outcomes
+        while outcomes and outcomes[0][0] < now - self.window:
+            _, failed, slow = outcomes.popleft()
+            self._failures -= failed
+            self._slow -= slow
+
+    def _trip(self):
+        self.opened_at = self._clock()
+        self.opened += 1
+        self._transition(OPEN)
+
+    def _transition(self, state: str):
+        if state == self.state:
+            return
+        detail = ""
+        calls = len(self._outcomes)
+        if state == OPEN and calls:
+            detail = f" ({self._failures}/{calls} failed, {self._slow}/{calls} slow)"
+        logging.warning(f"Circuit for {self.name}: {self.state} -> {state}{detail}")
+        self.state = state
+        self._trials = 0
+        self._trial_successes = 0
+        if state != OPEN:
+            self._outcomes.clear()
+            self._failures = self._slow = 0
+
+    def current_state(self) -> str:
+        """State as the next call would find it (open turns half-open lazily)."""
+        if self.state == OPEN and self._clock() >= self.opened_at + self.open_seconds:
+            return HALF_OPEN
+        return self.state
+
+    def stats(self) -> dict:
+        calls = len(self._outcomes)
+        return {
+            "state": self.state,
+            "calls": calls,
+            "failure_rate": round(self._failures / calls, 3) if calls else 0.0,
+            "slow_rate": round(self._slow / calls, 3) if calls else 0.0,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,223 @@
+"""
+Local City Index
+----------------
+Compact name -> OpenWeatherMap city ID / coordinates index, built from the
+OpenWeatherMap bulk city list (city.list.json.gz) and queried through mmap.
+- One sorted, tab-separated line per key: key, id, lat, lon, country, name
+- Keys are normalized names ("sao paulo"), "name,cc" ("london,gb") and aliases
+- Exact, prefix and alias lookups by binary search; nothing is loaded into RAM
+- Close-match suggestions for names that are not in the index
+
+Build:
+    python city_index.py build city.list.json.gz city_index.tsv [--aliases aliases.json]
+Query:
+    python city_index.py lookup city_index.tsv "Bombay"
+"""
+
+import argparse
+import difflib
+import gzip
+import json
+import mmap
+import os
+import re
+from typing import NamedTuple
+
+from weather_cache import normalize_city
+
+# Historic / alternative names that the OpenWeatherMap list does not carry.
+DEFAULT_ALIASES = {
+    "bombay": "mumbai",
+    "madras": "chennai",
+    "calcutta": "kolkata",
+    "bangalore": "bengaluru",
+    "peking": "beijing",
+    "canton": "guangzhou",
+    "saigon": "ho chi minh city",
+    "nyc": "new york",
+}
+
+class CityRecord(NamedTuple):
+    id: int
+    name: str
+    country: str
+    lat: float
+    lon: float
+
+    def label(self) -> str:
+        return f"{self.name}, {self.country}" if self.country else self.name
+
+def index_key(city: str) -> str:
+    """'  London ,  GB ' -> 'london,gb'; 'Springfield, IL, US' -> 'springfield,us'"""
+    parts = [p.strip() for p in normalize_city(city).split(",")]
+    parts = [p for p in parts if p]
+    if len(parts) > 1:
+        return f"{parts[0]},{parts[-1]}"
+    return parts[0] if parts else ""
+
+# --------------------------------------------------------------------
+# Index reader
+# --------------------------------------------------------------------
+class CityIndex:
+    """Read-only view over an index file built by build_index()."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @classmethod
+    def open(cls, path: str):
+        """Return the index at `path`, or None when there is no usable file."""
+        if not path or not os.path.isfile(path) or os.path.getsize(path) == 0:
+            return None
+        return cls(path)
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    def _first_at_or_after(self, key: bytes) -> int:
+        """Offset of the first line whose key is >= `key`."""
+        mm = self._mm
+        lo, hi = 0, len(mm)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = mm.rfind(b"\n", 0, mid) + 1
+            end = mm.find(b"\n", start)
+            if end == -1:
+                end = len(mm)
+            if mm[start:mm.find(b"\t", start, end)] < key:
+                lo = end + 1
+            else:
+                hi = start
+        return lo
+
+    def _scan(self, offset: int):
+        """Yield (key, CityRecord) for each line from `offset` onwards."""
+        mm = self._mm
+        while offset < len(mm):
+            end = mm.find(b"\n", offset)
+            if end == -1:
+                end = len(mm)
+            key, city_id, lat, lon, country, name = mm[offset:end].decode("utf-8").split("\t")
+            yield key, CityRecord(int(city_id), name, country, float(lat), float(lon))
+            offset = end + 1
+
+    def lookup(self, city: str) -> list[CityRecord]:
+        """All records whose name, "name,cc" or alias matches `city` exactly."""
+        key = index_key(city)
+        if not key:
+            return []
+        records = []
+        for line_key, record in self._scan(self._first_at_or_after(key.encode("utf-8"))):
+            if line_key != key:
+                break
+            records.append(record)
+        return records
+
+    def resolve(self, city: str):
+        """The record for `city` if the name is unambiguous, otherwise None."""
+        records = self.lookup(city)
+        return records[0] if len(records) == 1 else None
+
+    def prefix(self, prefix: str, limit: int = 10) -> list[tuple[str, CityRecord]]:
+        """Up to `limit` (key, record) pairs whose key starts with `prefix`."""
+        key = index_key(prefix)
+        matches = []
+        for line_key, record in self._scan(self._first_at_or_after(key.encode("utf-8"))):
+            if not line_key.startswith(key) or len(matches) >= limit:
+                break
+            matches.append((line_key, record))
+        return matches
+
+    def suggest(self, city: str, limit: int = 3) -> list[str]:
+        """Labels of indexed cities whose names are close to `city`."""
+        key = index_key(city)
+        if not key:
+            return []
+        candidates = {}
+        for probe in (key, key[:3]):
+            for line_key, record in self.prefix(probe, limit=200):
+                candidates.setdefault(line_key, record)
+        neighbours = self._scan(self._first_at_or_after(key.encode("utf-8")))
+        for (line_key, record), _ in zip(neighbours, range(50)):
+            candidates.setdefault(line_key, record)
+        close = difflib.get_close_matches(key, list(candidates), n=limit * 3, cutoff=0.6)
+        labels = dict.fromkeys(candidates[k].label() for k in close)
+        return list(labels)[:limit]
+
+# --------------------------------------------------------------------
+# Index builder
+# --------------------------------------------------------------------
+def _clean(text) -> str:
+    return re.sub(r"[\t\r\n]+", " ", str(text or "")).strip()
+
+def build_index(source_path: str, out_path: str, aliases: dict = None) -> int:
+    """
+    Build an index file from the OpenWeatherMap city list (JSON or JSON.gz).
+    Returns the number of lines written.
+    """
+    opener = gzip.open if source_path.endswith(".gz") else open
+    with opener(source_path, "rt", encoding="utf-8") as f:
+        cities = json.load(f)
+
+    rows = set()
+    by_name: dict[str, list[tuple]] = {}
+    for city in cities:
+        name = _clean(city.get("name"))
+        key = normalize_city(name)
+        if not key or "," in key:
+            continue
+        country = _clean(city.get("country")).upper()
+        coord = city.get("coord") or {}
+        fields = (int(city["id"]), f"{coord.get('lat', 0.0):.4f}", f"{coord.get('lon', 0.0):.4f}",
+                  country, name)
+        rows.add((key, *fields))
+        if country:
+            rows.add((f"{key},{country.lower()}", *fields))
+        by_name.setdefault(key, []).append(fields)
+
+    for alias, target in {**DEFAULT_ALIASES, **(aliases or {})}.items():
+        alias = normalize_city(alias)
+        for fields in by_name.get(normalize_city(target), []):
+            rows.add((alias, *fields))
+            if fields[3]:
+                rows.add((f"{alias},{fields[3].lower()}", *fields))
+
+    lines = sorted("\t".join(str(v) for v in row).encode("utf-8") for row in rows)
+    with open(out_path, "wb") as f:
+        f.write(b"\n".join(lines))
+    return len(lines)
+
+# --------------------------------------------------------------------
+# CLI
+# --------------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or query the local city index.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="build an index from city.list.json(.gz)")
+    build.add_argument("source")
+    build.add_argument("output")
+    build.add_argument("--aliases", help="JSON file mapping alias -> city name")
+    query = sub.add_parser("lookup", help="look a city up in an index")
+    query.add_argument("index")
+    query.add_argument("city")
+    cli = parser.parse_args()
+
+    if cli.command == "build":
+        extra = None
+        if cli.aliases:
+            with open(cli.aliases, encoding="utf-8") as f:
+                extra = json.load(f)
+        count = build_index(cli.source, cli.output, extra)
+        print(f"✅ Wrote {count} index lines to {cli.output}")
+    else:
+        index = CityIndex.open(cli.index)
+        if index is None:
+            raise SystemExit(f"No index at {cli.index}")
+        records = index.lookup(cli.city)
+        for record in records:
+            print(f"{record.id}\t{record.label()}\t{record.lat},{record.lon}")
+        if not records:
+            print(f"Unknown city. Did you mean: {', '.join(index.suggest(cli.city)) or '-'}?")
@@ -0,0 +1,137 @@
+"""
+Health Checks
+-------------
+Liveness / readiness for the MCP server.
+- Probes (upstream reachability, outbox depth) run periodically on the
+  serving loop; /readyz only reads their cached results, so a health check
+  never waits on an upstream
+- Checks (worker saturation, queue depth) are cheap reads of in-process
+  state, evaluated when readiness is requested
+- A critical probe that fails, has not run yet or has gone stale makes the
+  instance not ready; a non-critical one only marks it degraded
+
+Environment:
+    HEALTH_PROBE_INTERVAL    seconds between probe rounds (default 15)
+    HEALTH_PROBE_TIMEOUT     seconds before a probe counts as failed (default 3)
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Callable, NamedTuple, Optional
+
+HEALTH_PROBE_INTERVAL = float(os.getenv("HEALTH_PROBE_INTERVAL", "15"))
+HEALTH_PROBE_TIMEOUT = float(os.getenv("HEALTH_PROBE_TIMEOUT", "3"))
+
+class ProbeResult(NamedTuple):
+    ok: bool
+    detail: str
+    latency_ms: float
+    checked_at: float  # time.time()
+
+class Probe(NamedTuple):
+    fn: Callable
+    critical: bool
+
+class HealthMonitor:
+    def __init__(self, interval: float = HEALTH_PROBE_INTERVAL, timeout: float = HEALTH_PROBE_TIMEOUT):
+        self.interval = interval
+        self.timeout = timeout
+        # A result older than this means the probe loop itself is stuck.
+        self.max_age = 3 * interval + timeout
+        self.probes: dict[str, Probe] = {}
+        self.checks: dict[str, Callable] = {}
+        self.results: dict[str, ProbeResult] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def probe(self, name: str, critical: bool = True):
+        """
+        Decorator registering an async probe. It returns a short detail
+        string when healthy and raises when not.
+        """
+        def register(fn):
+            self.probes[name] = Probe(fn, critical)
+            return fn
+        return register
+
+    def check(self, name: str):
+        """Decorator registering a sync check returning (ok, detail)."""
+        def register(fn):
+            self.checks[name] = fn
+            return fn
+        return register
+
+    # ----------------------------------------------------------------
+    # Background probing
+    # ----------------------------------------------------------------
+    async def _run_probe(self, name: str, probe: Probe):
+        started = time.perf_counter()
+        try:
+            detail = await asyncio.wait_for(probe.fn(), self.timeout)
+            ok = True
+        except asyncio.TimeoutError:
+            ok, detail = False, f"timed out after {self.timeout:g}s"
+        except Exception as e:
+            ok, detail = False, str(e) or type(e).__name__
+        previous = self.results.get(name)
+        if previous is not None and previous.ok != ok:
+            logging.warning(f"Health probe '{name}' is now {'up' if ok else 'down'}: {detail}")
+        self.results[name] = ProbeResult(
+            ok, str(detail or "ok"), round((time.perf_counter() - started) * 1000, 1), time.time()
+        )
+
+    async def run_probes(self):
+        await asyncio.gather(*(self._run_probe(n, p) for n, p in self.probes.items()))
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.run_probes()
+            except Exception:
+                logging.exception("Health probe round failed:")
+            await asyncio.sleep(self.interval)
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    # ----------------------------------------------------------------
+    # Readiness
+    # ----------------------------------------------------------------
+    def readiness(self) -> tuple[bool, dict]:
+        """(ready, report) from cached probe results plus the live checks."""
+        now = time.time()
+        ready, degraded = True, False
+        report = {}
+        for name, probe in self.probes.items():
+            result = self.results.get(name)
+            if result is None:
+                entry = {"ok": False, "detail": "not probed yet"}
+            elif now - result.checked_at > self.max_age:
+                entry = {"ok": False, "detail": f"stale result ({now - result.checked_at:.0f}s old)"}
+            else:
+                entry = {"ok": result.ok, "detail": result.detail, "latency_ms": result.latency_ms,
+                         "age_s": round(now - result.checked_at, 1)}
+            entry["critical"] = probe.critical
+            if not entry["ok"]:
+                if probe.critical:
+                    ready = False
+                else:
+                    degraded = True
+            report[name] = entry
+        for name, check in self.checks.items():
+            try:
+                ok, detail = check()
+            except Exception as e:
+                ok, detail = False, f"check failed: {e}"
+            report[name] = {"ok": ok, "detail": detail, "critical": True}
+            ready = ready and ok
+        status = "ready" if ready and not degraded else "degraded" if ready else "not ready"
+        return ready, {"status": status, "checks": report}
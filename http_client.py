@@ -0,0 +1,155 @@
+"""
+Shared Async HTTP Client
+------------------------
+Process-wide upstream HTTP layer used by the MCP tools.
+- One pooled httpx.AsyncClient per upstream host (keep-alive, per-host limits)
+- HTTP/2 when the optional 'h2' package is installed
+- Configurable connect/read timeouts so a slow upstream fails instead of hanging
+- Request latency recorded per upstream host and status class (metrics.py)
+- Each request is a client span, with traceparent forwarded (tracing.py)
+- A circuit breaker per upstream host fails calls fast with CircuitOpen
+  while that host is failing or slow (circuit_breaker.py)
+
+Environment:
+    HTTP_CONNECT_TIMEOUT       seconds to establish a connection (default 3)
+    HTTP_READ_TIMEOUT          seconds to wait for a response     (default 10)
+    HTTP_MAX_CONNECTIONS       connections per upstream host      (default 50)
+    HTTP_MAX_KEEPALIVE         idle keep-alive connections per host (default 20)
+    HTTP_KEEPALIVE_EXPIRY      seconds an idle connection is kept (default 30)
+"""
+
+import asyncio
+import os
+import time
+import weakref
+from urllib.parse import urlsplit
+
+import httpx
+
+import tracing
+from circuit_breaker import CLOSED, STATE_VALUES, CircuitBreaker
+from metrics import UPSTREAM_LATENCY, CallbackMetric, status_class
+
+# --------------------------------------------------------------------
+# Configuration
+# --------------------------------------------------------------------
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "10"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "50"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+
+try:
+    import h2  # noqa: F401
+    HTTP2_ENABLED = True
+except ImportError:
+    HTTP2_ENABLED = False
+
+# Clients hold sockets bound to the loop that opened them, so they are
+# tracked per event loop and then per upstream origin.
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, httpx.AsyncClient]]" = (
+    weakref.WeakKeyDictionary()
+)
+# Breakers describe the upstream, not a connection, so they are shared by
+# every loop and keyed by host alone.
+_breakers: dict[str, CircuitBreaker] = {}
+
+# --------------------------------------------------------------------
+# Client pool
+# --------------------------------------------------------------------
+def _origin(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+def _new_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=HTTP2_ENABLED,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+    )
+
+def get_client(url: str) -> httpx.AsyncClient:
+    """Return the pooled client for the upstream host of `url`."""
+    loop = asyncio.get_running_loop()
+    clients = _clients.setdefault(loop, {})
+    origin = _origin(url)
+    client = clients.get(origin)
+    if client is None or client.is_closed:
+        client = clients[origin] = _new_client()
+    return client
+
+def get_breaker(host: str) -> CircuitBreaker:
+    """Return the circuit breaker for an upstream host ('api.example.com:443')."""
+    breaker = _breakers.get(host)
+    if breaker is None:
+        breaker = _breakers[host] = CircuitBreaker(host)
+    return breaker
+
+def circuit_state(url: str) -> str:
+    """Breaker state for the upstream host of `url`, without touching it."""
+    breaker = _breakers.get(urlsplit(url).netloc)
+    return breaker.current_state() if breaker is not None else CLOSED
+
+async def request(method: str, url: str, use_breaker: bool = True, **kwargs) -> httpx.Response:
+    """
+    Send a request through the pooled client; raises CircuitOpen without
+    sending. `use_breaker=False` requests (health probes) neither pass nor
+    feed the host's breaker.
+    """
+    parts = urlsplit(url)
+    breaker = get_breaker(parts.netloc) if use_breaker else None
+    if breaker is not None:
+        breaker.before_call()
+    started = time.perf_counter()
+    status = "error"
+    completed = False
+    # Only host and path are recorded: query strings carry API keys.
+    attributes = {"http.request.method": method, "server.address": parts.netloc,
+                  "url.path": parts.path}
+    try:
+        with tracing.span(f"HTTP {method}", kind=tracing.CLIENT, attributes=attributes) as span:
+            if tracing.ENABLED:
+                kwargs["headers"] = tracing.inject(dict(kwargs.get("headers") or {}))
+            response = await get_client(url).request(method, url, **kwargs)
+            status = response.status_code
+            span.set_attribute("http.response.status_code", status)
+            completed = True
+            return response
+    except httpx.HTTPError:
+        completed = True
+        raise
+    finally:
+        latency = time.perf_counter() - started
+        UPSTREAM_LATENCY.labels(parts.netloc, status_class(status)).observe(latency)
+        if breaker is not None:
+            if completed:
+                breaker.after_call(status, latency)
+            else:
+                breaker.cancel_call()
+
+CallbackMetric("mcp_upstream_circuit_state", "Circuit breaker state (0 closed, 1 half-open, 2 open).",
+               lambda: {(host,): STATE_VALUES[breaker.current_state()]
+                        for host, breaker in _breakers.items()},
+               labelnames=("upstream",))
+CallbackMetric("mcp_upstream_circuit_opened_total", "Times the circuit breaker opened.",
+               lambda: {(host,): b.opened for host, b in _breakers.items()},
+               type="counter", labelnames=("upstream",))
+CallbackMetric("mcp_upstream_circuit_rejected_total", "Calls failed fast by an open circuit.",
+               lambda: {(host,): b.rejected for host, b in _breakers.items()},
+               type="counter", labelnames=("upstream",))
+
+async def get(url: str, **kwargs) -> httpx.Response:
+    return await request("GET", url, **kwargs)
+
+async def post(url: str, **kwargs) -> httpx.Response:
+    return await request("POST", url, **kwargs)
+
+async def aclose():
+    """Close every client opened on the running loop."""
+    clients = _clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.aclose()
@@ -2,60 +2,436 @@
 Flask + MCP Server with Weather + Notification Tools
 ----------------------------------------------------
 - get_weather(city): Fetch current weather via OpenWeatherMap API
-- send_notification(notification_input): Push message via Ntfy
+- get_weather_bulk(cities): Weather for many cities via group requests
+- send_notification(notification_input): Queue a push message for Ntfy
+- get_notification_status(message_id): Delivery status of a queued message
+
+Serving modes:
+- python mcp_server.py --mode asgi   -> Starlette app on uvicorn (one event loop)
+- python mcp_server.py               -> Flask app (compatibility mode)
+
+Upstream calls go through a per-host circuit breaker (see circuit_breaker.py);
+while OpenWeatherMap's is open, cached weather is served however old.
+
+Liveness and readiness are served at /livez and /readyz (see health.py),
+Prometheus metrics at /metrics. Trace context arrives in the
+traceparent header or params._meta.traceparent (see tracing.py).
 """
 
 from flask import Flask, request, jsonify
 from mcp.server import Server
 from mcp.types import Tool, TextContent
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import HTMLResponse, JSONResponse, Response
+from starlette.routing import Route
+import argparse
 import asyncio
+import contextlib
+import httpx
+import json
 import logging
+import math
 import os
-import requests
+import threading
+import time
+from typing import NamedTuple
+
+import http_client
+import metrics
+import tracing
+from adaptive_limit import AdaptiveLimiter, Overloaded
+from circuit_breaker import CLOSED, OPEN, CircuitOpen
+from city_index import CityIndex
+from health import HEALTH_PROBE_TIMEOUT, HealthMonitor
+from metrics import CallbackMetric
+from notification_queue import DeliveryDeferred, NotificationOutbox
+from tool_registry import ToolRegistry, UnknownToolError
+from weather_cache import SingleFlight, TTLCache, normalize_city
 
 # --------------------------------------------------------------------
 # Basic setup
 # --------------------------------------------------------------------
 logging.basicConfig(level=logging.INFO)
+tracing.set_service_name("mcp-server")
 mcp_server = Server("flask-mcp-server")
 app = Flask(__name__)
+# Tool calls pass an adaptive concurrency limit; mcp/list_tools never does.
+TOOLS = ToolRegistry(limiter=AdaptiveLimiter())
+
+# Upstream base URLs can point at local stand-ins (see mock_upstreams.py).
+OPENWEATHER_BASE_URL = os.getenv("OPENWEATHER_BASE_URL", "http://api.openweathermap.org").rstrip("/")
+NTFY_BASE_URL = os.getenv("NTFY_BASE_URL", "https://ntfy.sh").rstrip("/")
+
+WEATHER_URL = f"{OPENWEATHER_BASE_URL}/data/2.5/weather"
+WEATHER_GROUP_URL = f"{OPENWEATHER_BASE_URL}/data/2.5/group"
+WEATHER_GROUP_LIMIT = 20  # max city IDs per group request
+WEATHER_BULK_MAX_CITIES = int(os.getenv("WEATHER_BULK_MAX_CITIES", "500"))
+NTFY_URL = f"{NTFY_BASE_URL}/athlour"
+
+# Weather responses: fresh for WEATHER_CACHE_TTL seconds, then served stale
+# (while refreshing) for up to WEATHER_CACHE_STALE_TTL more seconds. Past
+# that they are kept WEATHER_CACHE_STALE_IF_ERROR seconds longer, as the
+# answer of last resort while OpenWeatherMap is unavailable.
+WEATHER_CACHE = TTLCache(
+    max_size=int(os.getenv("WEATHER_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("WEATHER_CACHE_TTL", "600")),
+    stale_ttl=float(os.getenv("WEATHER_CACHE_STALE_TTL", "300")),
+    stale_if_error=float(os.getenv("WEATHER_CACHE_STALE_IF_ERROR", "3600")),
+)
+# Concurrent lookups for the same normalized city share one upstream call.
+WEATHER_FLIGHTS = SingleFlight()
+# normalized city -> OpenWeatherMap city ID, learned from successful lookups
+# so bulk requests can use the group-by-ID endpoint. Bounded, since keys are
+# whatever strings callers send and OpenWeatherMap fuzzy-matches.
+CITY_IDS = TTLCache(
+    max_size=int(os.getenv("CITY_IDS_SIZE", "4096")),
+    ttl=float(os.getenv("CITY_IDS_TTL", "86400")),
+    stale_ttl=0,
+)
+# Optional local index (see city_index.py). When present, names are resolved
+# to IDs before any request, and unknown names are rejected locally.
+CITY_INDEX = CityIndex.open(os.getenv("CITY_INDEX_PATH", "city_index.tsv"))
+if CITY_INDEX is not None:
+    logging.info(f"Loaded city index from {CITY_INDEX.path}")
+_background_tasks: set[asyncio.Task] = set()
 
 # --------------------------------------------------------------------
 # TOOL: get_weather(city)
 # --------------------------------------------------------------------
-def get_weather(city: str) -> str:
+class WeatherLookupError(Exception):
+    """Upstream lookup failed; the message is returned to the caller as-is."""
+
+class WeatherUnavailable(WeatherLookupError):
+    """OpenWeatherMap could not answer (circuit open, unreachable, 5xx or 429)."""
+
+class Fallback(NamedTuple):
+    """Cached data served because a fresh lookup failed."""
+    data: dict
+    age: float  # seconds since it was fetched
+
+class WeatherQuery(NamedTuple):
+    city: str      # name as the caller wrote it, used in replies
+    key: str       # canonical cache / single-flight key
+    params: dict   # OpenWeatherMap location parameters ({"id": ...} or {"q": ...})
+
+def resolve_city(city: str) -> WeatherQuery:
+    """
+    Turn a city name into a canonical WeatherQuery. With a city index,
+    unambiguous names (and aliases such as 'Bombay') resolve to their
+    OpenWeatherMap ID, and unknown names raise WeatherLookupError with
+    suggestions instead of costing an upstream call.
+    """
+    if CITY_INDEX is not None:
+        records = CITY_INDEX.lookup(city)
+        if not records:
+            suggestions = CITY_INDEX.suggest(city)
+            hint = f" Did you mean: {'; '.join(suggestions)}?" if suggestions else ""
+            raise WeatherLookupError(f"Unknown city '{city}'.{hint}")
+        if len(records) == 1:
+            return WeatherQuery(city, f"id:{records[0].id}", {"id": records[0].id})
+    return WeatherQuery(city, normalize_city(city), {"q": city})
+
+def check_weather_response(response: httpx.Response):
+    if response.status_code >= 500 or response.status_code == 429:
+        raise WeatherUnavailable(
+            f"Error fetching weather: OpenWeatherMap returned HTTP {response.status_code}"
+        )
+    if response.status_code != 200:
+        raise WeatherLookupError(
+            f"Error fetching weather: {response.json().get('message', 'Unknown error')}"
+        )
+
+async def fetch_weather(query: WeatherQuery, api_key: str) -> dict:
+    """Query OpenWeatherMap and cache the successful response."""
+    try:
+        response = await http_client.get(
+            WEATHER_URL, params={**query.params, "appid": api_key, "units": "metric"}
+        )
+    except CircuitOpen as e:
+        raise WeatherUnavailable(f"Error fetching weather: {e}")
+    except httpx.HTTPError as e:
+        raise WeatherUnavailable(f"Error fetching weather: {e!r}")
+    check_weather_response(response)
+
+    data = response.json()
+    if not (data.get('main') and data.get('weather')):
+        raise WeatherLookupError(
+            f"Unable to fetch weather for {query.city}. Please check the city name."
+        )
+    WEATHER_CACHE.set(query.key, data)
+    if data.get('id'):
+        CITY_IDS.set(query.key, data['id'])
+    return data
+
+async def fetch_weather_once(query: WeatherQuery, api_key: str) -> dict:
+    """fetch_weather, coalesced with any identical lookup already in flight."""
+    return await WEATHER_FLIGHTS.do(query.key, fetch_weather, query, api_key)
+
+def refresh_in_background(query: WeatherQuery, api_key: str):
+    """Revalidate a stale cache entry without making the caller wait."""
+    if WEATHER_FLIGHTS.in_flight(query.key):
+        return
+
+    async def refresh():
+        try:
+            await fetch_weather_once(query, api_key)
+        except WeatherLookupError as e:
+            logging.warning(f"Background weather refresh for '{query.city}' failed: {e}")
+
+    task = asyncio.get_running_loop().create_task(refresh())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+def fallback_weather(query: WeatherQuery):
+    """Cached data for a query whose lookup failed, or None."""
+    cached = WEATHER_CACHE.get_if_error(query.key)
+    return Fallback(*cached) if cached is not None else None
+
+def format_weather(city: str, data, age: float = None) -> str:
+    if isinstance(data, Fallback):
+        data, age = data
+    temp = data['main']['temp']
+    description = data['weather'][0]['description']
+    weather_info = f"The current temperature in {city} is {temp}°C with {description}."
+    if 'rain' in description.lower():
+        weather_info += " Heavy rain expected. Carry an umbrella!"
+    if age is not None:
+        weather_info += f" (⚠️ OpenWeatherMap is unavailable; reported {math.ceil(age / 60)} min ago.)"
+    return weather_info
+
+@TOOLS.tool(
+    name="get_weather",
+    description="Fetches current weather for a given city using OpenWeatherMap API.",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "city": {"type": "string", "description": "City name to get weather for"}
+        },
+        "required": ["city"],
+    },
+)
+async def get_weather(city: str) -> str:
     """
     Fetches the current weather for a given city using OpenWeatherMap API.
     Advises to carry an umbrella if rain is mentioned in the description.
+    Responses are cached per resolved city; stale entries are served
+    immediately and refreshed in the background, and while OpenWeatherMap
+    is unavailable any cached entry is served, marked with its age.
     """
-    api_key = ""
+    api_key = os.getenv("WEATHER_API_KEY", "")
     if not api_key:
         return "Weather API key not found. Please set the WEATHER_API_KEY environment variable."
 
-    url = f"http://api.openweathermap.org/data/2.5/weather?q={city}&appid={api_key}&units=metric"
-    response = requests.get(url)
-    if response.status_code != 200:
-        return f"Error fetching weather: {response.json().get('message', 'Unknown error')}"
+    try:
+        query = resolve_city(city)
+        with tracing.span("cache.lookup", attributes={"cache.key": query.key}) as span:
+            cached = WEATHER_CACHE.get(query.key)
+            span.set_attribute("cache.result", "miss" if cached is None else
+                               "stale" if cached[1] else "hit")
+        if cached is not None:
+            data, stale = cached
+            if stale:
+                refresh_in_background(query, api_key)
+        else:
+            try:
+                data = await fetch_weather_once(query, api_key)
+            except WeatherUnavailable:
+                data = fallback_weather(query)
+                if data is None:
+                    raise
+    except WeatherLookupError as e:
+        return str(e)
+    return format_weather(city, data)
 
-    data = response.json()
-    if data.get('main') and data.get('weather'):
-        temp = data['main']['temp']
-        description = data['weather'][0]['description']
-        weather_info = f"The current temperature in {city} is {temp}°C with {description}."
-        if 'rain' in description.lower():
-            weather_info += " Heavy rain expected. Carry an umbrella!"
-        return weather_info
-    else:
-        return f"Unable to fetch weather for {city}. Please check the city name."
+# --------------------------------------------------------------------
+# TOOL: get_weather_bulk(cities)
+# --------------------------------------------------------------------
+async def fetch_weather_group(city_ids: list[int], api_key: str) -> dict[int, dict]:
+    """One group request for up to WEATHER_GROUP_LIMIT city IDs."""
+    try:
+        response = await http_client.get(WEATHER_GROUP_URL, params={
+            "id": ",".join(str(i) for i in city_ids), "appid": api_key, "units": "metric"
+        })
+    except CircuitOpen as e:
+        raise WeatherUnavailable(f"Error fetching weather: {e}")
+    except httpx.HTTPError as e:
+        raise WeatherUnavailable(f"Error fetching weather: {e!r}")
+    check_weather_response(response)
+    return {item['id']: item for item in response.json().get('list', []) if item.get('id')}
+
+async def fetch_weather_by_ids(queries: dict[int, list[WeatherQuery]],
+                              api_key: str) -> dict[str, object]:
+    """
+    Fetch {city ID: queries} through group requests; every query sharing an
+    ID (e.g. 'London' and 'London,GB') gets the same reply. Cities missing
+    from a group reply fall back to a single lookup. When a group request
+    itself fails, its cities get the error (or cached data while
+    OpenWeatherMap is unavailable) rather than one more request each.
+    """
+    ids = list(queries)
+    chunks = [ids[i:i + WEATHER_GROUP_LIMIT] for i in range(0, len(ids), WEATHER_GROUP_LIMIT)]
+    replies = await asyncio.gather(
+        *(fetch_weather_group(chunk, api_key) for chunk in chunks), return_exceptions=True
+    )
+
+    results, leftovers = {}, []
+    for chunk, reply in zip(chunks, replies):
+        if isinstance(reply, BaseException):
+            if not isinstance(reply, WeatherLookupError):
+                raise reply
+            unavailable = isinstance(reply, WeatherUnavailable)
+            for city_id in chunk:
+                for query in queries[city_id]:
+                    results[query.key] = (unavailable and fallback_weather(query)) or str(reply)
+            continue
+        for city_id in chunk:
+            data = reply.get(city_id)
+            for query in queries[city_id]:
+                if data and data.get('main') and data.get('weather'):
+                    WEATHER_CACHE.set(query.key, data)
+                    results[query.key] = data
+                else:
+                    leftovers.append(query)
+    results.update(await fetch_weather_singly(leftovers, api_key))
+    return results
+
+async def fetch_weather_singly(queries: list[WeatherQuery], api_key: str) -> dict[str, object]:
+    """
+    Concurrent single lookups; failures map to their error message, or to
+    a cached Fallback while OpenWeatherMap is unavailable.
+    """
+    replies = await asyncio.gather(
+        *(fetch_weather_once(query, api_key) for query in queries), return_exceptions=True
+    )
+    results = {}
+    for query, reply in zip(queries, replies):
+        if isinstance(reply, WeatherUnavailable):
+            reply = fallback_weather(query) or str(reply)
+        elif isinstance(reply, WeatherLookupError):
+            reply = str(reply)
+        elif isinstance(reply, BaseException):
+            raise reply
+        results[query.key] = reply
+    return results
+
+@TOOLS.tool(
+    name="get_weather_bulk",
+    description="Fetches current weather for many cities in one call (one line per city).",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "cities": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "City names to get weather for",
+            }
+        },
+        "required": ["cities"],
+    },
+    max_concurrency=int(os.getenv("WEATHER_BULK_CONCURRENCY", "8")),
+    priority="low",
+)
+async def get_weather_bulk(cities: list[str]) -> str:
+    """
+    Fetches the current weather for many cities at once, one line per city.
+    Cached cities are answered locally; cities with a known OpenWeatherMap ID
+    are fetched WEATHER_GROUP_LIMIT at a time through the group endpoint, and
+    the rest with concurrent single lookups.
+    """
+    api_key = os.getenv("WEATHER_API_KEY", "")
+    if not api_key:
+        return "Weather API key not found. Please set the WEATHER_API_KEY environment variable."
+
+    if isinstance(cities, str):
+        cities = cities.split(",")
+    cities = [str(c).strip() for c in cities or [] if str(c).strip()]
+    if not cities:
+        return "No cities given."
+    if len(cities) > WEATHER_BULK_MAX_CITIES:
+        return f"Too many cities (max {WEATHER_BULK_MAX_CITIES})."
+
+    keys: list[str] = []
+    seen: set[str] = set()
+    results: dict[str, object] = {}
+    by_id: dict[int, list[WeatherQuery]] = {}
+    by_name: dict[str, WeatherQuery] = {}
+    for city in cities:
+        try:
+            query = resolve_city(city)
+        except WeatherLookupError as e:
+            keys.append(f"error:{city}")
+            results[keys[-1]] = str(e)
+            continue
+        keys.append(query.key)
+        if query.key in seen:
+            continue
+        seen.add(query.key)
+        cached = WEATHER_CACHE.get(query.key)
+        learned = CITY_IDS.get(query.key)
+        city_id = query.params.get("id") or (learned[0] if learned else None)
+        if cached is not None:
+            data, stale = cached
+            if stale:
+                refresh_in_background(query, api_key)
+            results[query.key] = data
+        elif city_id:
+            by_id.setdefault(city_id, []).append(query)
+        else:
+            by_name[query.key] = query
+
+    grouped, single = await asyncio.gather(
+        fetch_weather_by_ids(by_id, api_key), fetch_weather_singly(list(by_name.values()), api_key)
+    )
+    results.update(grouped)
+    results.update(single)
+
+    lines = []
+    for city, key in zip(cities, keys):
+        result = results[key]
+        lines.append(result if isinstance(result, str) else format_weather(city, result))
+    return "\n".join(lines)
 
 # --------------------------------------------------------------------
 # TOOL: send_notification(notification_input)
 # --------------------------------------------------------------------
-import requests
+class NotificationError(Exception):
+    """ntfy rejected or did not answer a push."""
+
+async def push_notification(topic: str, body: str):
+    """Deliver one (possibly batched) outbox push to ntfy."""
+    try:
+        response = await http_client.post(NTFY_URL, content=body.encode("utf-8"))
+    except CircuitOpen as e:
+        # Held in the outbox without spending a delivery attempt.
+        raise DeliveryDeferred(str(e), e.retry_after)
+    except httpx.HTTPError as e:
+        raise NotificationError(repr(e))
+    if response.status_code != 200:
+        raise NotificationError(f"HTTP {response.status_code}")
 
-def send_notification(notification_input: str) -> str:
+# Messages are persisted first and pushed by background workers.
+OUTBOX = NotificationOutbox(push_notification)
+
+@TOOLS.tool(
+    name="send_notification",
+    description="Sends a push notification using the Ntfy API. Format: 'message|topic'.",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "notification_input": {
+                "type": "string",
+                "description": "Input format: 'message|topic'",
+            }
+        },
+        "required": ["notification_input"],
+    },
+    priority="high",
+)
+async def send_notification(notification_input: str) -> str:
     """
-    Sends a push notification using the Ntfy API.
+    Queues a push notification for the Ntfy API and returns its message ID
+    as soon as it is stored; delivery is retried in the background.
     Provide input as: "message|topic"
     Example: "Hello World|genai_demo"
     """
@@ -69,168 +445,589 @@ def send_notification(notification_input: str) -> str:
             return "Invalid input. Format must be 'message|topic'."
 
         message, topic = parts
-        url = f"https://ntfy.sh/athlour"
-        response = requests.post(url, data=message.strip().encode("utf-8"))
-
-        if response.status_code == 200:
-            return f"✅ Notification sent to '{topic.strip()}': {message.strip()}"
-        return f"❌ Failed to send notification (HTTP {response.status_code})"
+        message_id, duplicate = await OUTBOX.enqueue(topic.strip(), message.strip())
+        if duplicate:
+            return (
+                f"✅ Duplicate notification for '{topic.strip()}' suppressed "
+                f"(already queued as id {message_id}): {message.strip()}"
+            )
+        return f"✅ Notification queued for '{topic.strip()}' (id {message_id}): {message.strip()}"
 
     except Exception as e:
         return f"Error sending notification: {e}"
 
+# --------------------------------------------------------------------
+# TOOL: get_notification_status(message_id)
+# --------------------------------------------------------------------
+@TOOLS.tool(
+    name="get_notification_status",
+    description="Looks up the delivery status of a notification queued by send_notification.",
+    input_schema={
+        "type": "object",
+        "properties": {
+            "message_id": {
+                "type": "integer",
+                "description": "ID returned by send_notification",
+            }
+        },
+        "required": ["message_id"],
+    },
+    priority="high",
+)
+async def get_notification_status(message_id: int) -> str:
+    """Reports pending / sending / sent / failed for a queued notification."""
+    try:
+        message_id = int(message_id)
+    except (TypeError, ValueError):
+        return "Invalid message ID."
+
+    row = await OUTBOX.status(message_id)
+    if row is None:
+        return f"No notification with ID {message_id}."
+    status = (
+        f"Notification {message_id} to '{row['topic']}': {row['status']} "
+        f"after {row['attempts']} attempt(s)."
+    )
+    if row["last_error"] and row["status"] != "sent":
+        status += f" Last error: {row['last_error']}"
+    return status
+
 # --------------------------------------------------------------------
 # Register MCP tools
 # --------------------------------------------------------------------
+# Tools register themselves on TOOLS above; serialize the catalog once now.
+TOOLS.catalog_json()
+
+# Tool discovery is cacheable: clients revalidate with If-None-Match.
+TOOLS_CACHE_CONTROL = f"public, max-age={int(os.getenv('TOOLS_CACHE_MAX_AGE', '60'))}"
+
+def tools_headers() -> dict:
+    return {"ETag": TOOLS.catalog_etag(), "Cache-Control": TOOLS_CACHE_CONTROL}
+
+def etag_matches(if_none_match, etag: str) -> bool:
+    """If-None-Match check (weak comparison, as RFC 9110 requires)."""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or any(tag.removeprefix("W/") == etag for tag in tags)
+
 @mcp_server.list_tools()
 async def list_tools() -> list[Tool]:
     """Advertise available tools to clients."""
-    return [
-        Tool(
-            name="get_weather",
-            description="Fetches current weather for a given city using OpenWeatherMap API.",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "city": {"type": "string", "description": "City name to get weather for"}
-                },
-                "required": ["city"],
-            },
-        ),
-        Tool(
-            name="send_notification",
-            description="Sends a push notification using the Ntfy API. Format: 'message|topic'.",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "notification_input": {
-                        "type": "string",
-                        "description": "Input format: 'message|topic'",
-                    }
-                },
-                "required": ["notification_input"],
-            },
-        ),
-    ]
+    return TOOLS.tools()
 
 @mcp_server.call_tool()
 async def call_tool(name: str, arguments: dict) -> list[TextContent]:
     """Handle tool calls from connector or ChatGPT MCP clients."""
     try:
-        if name == "get_weather":
-            city = arguments.get("city", "")
-            result = get_weather(city)
-            return [TextContent(type="text", text=result)]
+        result = await TOOLS.call(name, arguments)
+        return [TextContent(type="text", text=result)]
 
-        elif name == "send_notification":
-            notification_input = arguments.get("notification_input", "")
-            result = send_notification(notification_input)
-            return [TextContent(type="text", text=result)]
+    except UnknownToolError:
+        return [TextContent(type="text", text=f"Unknown tool: {name}")]
 
-        else:
-            return [TextContent(type="text", text=f"Unknown tool: {name}")]
+    except Overloaded as e:
+        return [TextContent(type="text", text=f"⏳ {e}")]
 
     except Exception as e:
         logging.exception("Tool execution error:")
         return [TextContent(type="text", text=f"Error executing tool {name}: {e}")]
 
+# --------------------------------------------------------------------
+# Metrics read from existing stats at scrape time
+# --------------------------------------------------------------------
+def _per_tool(field: str):
+    return lambda: {(name,): s[field] for name, s in TOOLS.stats()["tools"].items()}
+
+CallbackMetric("mcp_tool_queued", "Calls waiting for a per-tool concurrency slot.",
+               _per_tool("queued"), labelnames=("tool",))
+CallbackMetric("mcp_tool_running", "Tool calls currently executing.",
+               _per_tool("running"), labelnames=("tool",))
+CallbackMetric("mcp_tool_executor_queue_depth", "Blocking tool calls waiting for a worker thread.",
+               lambda: TOOLS.stats()["executor"]["queue_depth"])
+CallbackMetric("mcp_tool_executor_threads", "Worker threads started by the tool executor.",
+               lambda: TOOLS.stats()["executor"]["threads"])
+CallbackMetric("mcp_concurrency_limit", "Current adaptive concurrency limit for tool calls.",
+               lambda: TOOLS.limiter.limit)
+CallbackMetric("mcp_concurrency_in_flight", "Tool calls holding an adaptive limiter slot.",
+               lambda: TOOLS.limiter.in_flight)
+CallbackMetric("weather_cache_hit_ratio", "Share of weather lookups answered from cache.",
+               lambda: WEATHER_CACHE.stats()["hit_ratio"])
+CallbackMetric("weather_cache_lookups_total", "Weather cache lookups by result.",
+               lambda: {("hit",): WEATHER_CACHE.hits, ("stale",): WEATHER_CACHE.stale_hits,
+                        ("miss",): WEATHER_CACHE.misses,
+                        ("stale_if_error",): WEATHER_CACHE.error_hits},
+               type="counter", labelnames=("result",))
+CallbackMetric("weather_cache_entries", "Entries in the weather cache.",
+               lambda: WEATHER_CACHE.stats()["size"])
+CallbackMetric("weather_cache_evictions_total", "Weather cache LRU evictions.",
+               lambda: WEATHER_CACHE.evictions, type="counter")
+CallbackMetric("weather_fetches_in_flight", "Distinct upstream weather fetches in progress.",
+               lambda: WEATHER_FLIGHTS.stats()["in_flight"])
+CallbackMetric("weather_fetches_shared_total", "Lookups that joined a fetch already in flight.",
+               lambda: WEATHER_FLIGHTS.stats()["shared"], type="counter")
+
+# --------------------------------------------------------------------
+# Health: cached upstream probes + saturation checks
+# --------------------------------------------------------------------
+READY_MAX_IN_FLIGHT = int(os.getenv("READY_MAX_IN_FLIGHT", "256"))
+READY_MAX_EXECUTOR_QUEUE = int(os.getenv("READY_MAX_EXECUTOR_QUEUE", "32"))
+READY_MAX_TOOL_QUEUE = int(os.getenv("READY_MAX_TOOL_QUEUE", "64"))
+READY_MAX_OUTBOX_DEPTH = int(os.getenv("READY_MAX_OUTBOX_DEPTH", "1000"))
+# Upstreams whose outage takes the instance out of rotation; the others
+# only mark it degraded. None by default: an upstream is shared by every
+# instance, so its outage would empty the whole pool at once, although
+# weather can still be served stale and notifications wait in the outbox.
+READY_CRITICAL_UPSTREAMS = set(filter(None, os.getenv("READY_CRITICAL_UPSTREAMS", "").split(",")))
+
+HEALTH = HealthMonitor()
+
+class UpstreamDown(Exception):
+    pass
+
+async def probe_upstream(url: str) -> str:
+    """
+    Any answer below 500 means reachable; nothing is fetched or spent.
+    Probes bypass the upstream's circuit breaker, since a 401 to an idle
+    probe says nothing about the calls that tripped it, and only report
+    its state: reachable with the circuit open still counts as down.
+    """
+    response = await http_client.get(url, timeout=HEALTH_PROBE_TIMEOUT, use_breaker=False)
+    if response.status_code >= 500:
+        raise UpstreamDown(f"HTTP {response.status_code}")
+    state = http_client.circuit_state(url)
+    if state == OPEN:
+        raise UpstreamDown(f"HTTP {response.status_code}, but circuit open")
+    return f"HTTP {response.status_code}" + (f" (circuit {state})" if state != CLOSED else "")
+
+@HEALTH.probe("openweathermap", critical="openweathermap" in READY_CRITICAL_UPSTREAMS)
+async def probe_openweathermap() -> str:
+    # No appid: OpenWeatherMap answers 401 without using API quota.
+    return await probe_upstream(WEATHER_URL)
+
+@HEALTH.probe("ntfy", critical="ntfy" in READY_CRITICAL_UPSTREAMS)
+async def probe_ntfy() -> str:
+    return await probe_upstream(f"{NTFY_BASE_URL}/v1/health")
+
+@HEALTH.probe("notification_outbox")
+async def probe_outbox() -> str:
+    depth = await OUTBOX.depth()
+    if depth > READY_MAX_OUTBOX_DEPTH:
+        raise UpstreamDown(f"{depth} undelivered notifications (max {READY_MAX_OUTBOX_DEPTH})")
+    return f"{depth} undelivered"
+
+@HEALTH.check("requests_in_flight")
+def check_in_flight():
+    in_flight = int(metrics.REQUESTS_IN_FLIGHT.value)
+    return in_flight <= READY_MAX_IN_FLIGHT, f"{in_flight} in flight (max {READY_MAX_IN_FLIGHT})"
+
+@HEALTH.check("tool_executor")
+def check_executor():
+    depth = TOOLS.stats()["executor"]["queue_depth"]
+    return depth <= READY_MAX_EXECUTOR_QUEUE, f"{depth} queued (max {READY_MAX_EXECUTOR_QUEUE})"
+
+@HEALTH.check("tool_queue")
+def check_tool_queue():
+    queued = sum(s["queued"] for s in TOOLS.stats()["tools"].values())
+    return queued <= READY_MAX_TOOL_QUEUE, f"{queued} waiting for a tool slot (max {READY_MAX_TOOL_QUEUE})"
+
+CallbackMetric("mcp_health_probe_up", "Last background health probe result (1 = ok).",
+               lambda: {(name,): int(r.ok) for name, r in HEALTH.results.items()},
+               labelnames=("probe",))
+
+async def readiness() -> tuple[bool, dict]:
+    """Evaluated on the serving loop, next to the state it reads."""
+    return HEALTH.readiness()
+
+async def render_metrics() -> bytes:
+    """Scrape on the serving loop, the only thread that updates metrics."""
+    return metrics.REGISTRY.render()
+
+# --------------------------------------------------------------------
+# JSON-RPC dispatch (shared by the Flask and ASGI transports)
+# --------------------------------------------------------------------
+ROOT_HTML = (
+    "<h2>Flask + MCP Server</h2>"
+    "<p>Tools: get_weather(city), get_weather_bulk(cities), send_notification(notification_input), "
+    "get_notification_status(message_id)</p>"
+    "<p>POST JSON-RPC 2.0 requests to <code>/mcp</code>.</p>"
+)
+
+MCP_USAGE = {
+    "message": "MCP endpoint active. Use POST for JSON-RPC calls (single or batch).",
+    "example": {
+        "jsonrpc": "2.0",
+        "id": 1,
+        "method": "mcp/call_tool",
+        "params": {"tool": "get_weather", "arguments": {"city": "Chennai"}}
+    }
+}
+
+# Batches run their requests concurrently, at most MCP_BATCH_CONCURRENCY at a time.
+MCP_BATCH_CONCURRENCY = int(os.getenv("MCP_BATCH_CONCURRENCY", "16"))
+MCP_MAX_BATCH_SIZE = int(os.getenv("MCP_MAX_BATCH_SIZE", "100"))
+
+async def handle_jsonrpc(payload: dict) -> dict:
+    """
+    Execute one JSON-RPC request and build its response object, traced as a
+    child of params._meta.traceparent when the caller sent one.
+    """
+    params = payload.get("params")
+    meta = params.get("_meta") if isinstance(params, dict) else None
+    parent = tracing.extract(meta.get("traceparent")) if isinstance(meta, dict) else None
+    current = tracing.current()
+    if parent and current and parent.trace_id == current.trace_id:
+        parent = None  # same trace as the HTTP request: nest under its span
+    method = payload.get("method")
+    with tracing.span(f"jsonrpc {method}", parent=parent, kind=tracing.SERVER,
+                      attributes={"rpc.method": method, "rpc.id": payload.get("id")}) as span:
+        if method == "mcp/call_tool" and isinstance(params, dict):
+            span.set_attribute("mcp.tool", params.get("tool"))
+        return await dispatch_jsonrpc(payload)
+
+async def dispatch_jsonrpc(payload: dict) -> dict:
+    method = payload.get("method")
+    if method == "mcp/call_tool":
+        params = payload.get("params", {})
+        if not isinstance(params, dict):
+            return invalid_params(payload, "params must be an object")
+        tool = params.get("tool")
+        args = params.get("arguments", {})
+        if not isinstance(args, dict):
+            return invalid_params(payload, "params.arguments must be an object")
+
+        try:
+            result_text = await TOOLS.call(tool, args)
+        except UnknownToolError:
+            result_text = f"Unknown tool '{tool}'"
+        except Overloaded as e:
+            return overloaded_error(payload, e)
+
+        return {
+            "jsonrpc": "2.0",
+            "id": payload.get("id"),
+            "result": {
+                "content": [
+                    {"type": "text", "text": result_text}
+                ]
+            }
+        }
+
+    elif method == "mcp/list_tools":
+        return {
+            "jsonrpc": "2.0",
+            "id": payload.get("id"),
+            "result": {"tools": TOOLS.catalog()}
+        }
+
+    else:
+        return {
+            "jsonrpc": "2.0",
+            "id": payload.get("id"),
+            "error": {"code": -32601, "message": "Unknown method"}
+        }
+
+def parse_error() -> dict:
+    return {
+        "jsonrpc": "2.0",
+        "error": {"code": -32700, "message": "Invalid JSON"},
+        "id": None
+    }
+
+def invalid_request(message: str = "Invalid Request") -> dict:
+    return {
+        "jsonrpc": "2.0",
+        "error": {"code": -32600, "message": message},
+        "id": None
+    }
+
+def invalid_params(payload: dict, message: str) -> dict:
+    return {
+        "jsonrpc": "2.0",
+        "error": {"code": -32602, "message": f"Invalid params: {message}"},
+        "id": payload.get("id")
+    }
+
+def internal_error(payload, exc: Exception) -> dict:
+    return {
+        "jsonrpc": "2.0",
+        "id": payload.get("id") if isinstance(payload, dict) else None,
+        "error": {"code": -32000, "message": f"Internal Server Error: {exc}"}
+    }
+
+OVERLOADED = -32001  # implementation-defined server error: shed by the limiter
+
+def overloaded_error(payload: dict, exc: Overloaded) -> dict:
+    return {
+        "jsonrpc": "2.0",
+        "id": payload.get("id"),
+        "error": {"code": OVERLOADED, "message": str(exc),
+                  "data": {"retry_after": round(exc.retry_after, 3)}},
+    }
+
+def overload_headers(response) -> dict:
+    """Retry-After (whole seconds) when any reply in `response` was shed."""
+    replies = response if isinstance(response, list) else [response]
+    waits = [r["error"]["data"]["retry_after"] for r in replies
+             if isinstance(r, dict) and r.get("error", {}).get("code") == OVERLOADED]
+    return {"Retry-After": str(math.ceil(max(waits)))} if waits else {}
+
+def response_status(response, headers: dict) -> int:
+    """503 for a shed single request; a partly shed batch still gets 200."""
+    return 503 if headers and isinstance(response, dict) else 200
+
+def list_tools_response(request_id) -> bytes:
+    """mcp/list_tools reply spliced around the pre-serialized catalog."""
+    return b"".join((
+        b'{"jsonrpc":"2.0","id":', json.dumps(request_id).encode("utf-8"),
+        b',"result":{"tools":', TOOLS.catalog_json(), b"}}",
+    ))
+
+async def handle_payload(payload, traceparent: str = None):
+    """
+    Dispatch a payload, tracking in-flight count and latency. `traceparent`
+    is the request header, if any; the payload is traced as its child.
+    """
+    if isinstance(payload, list):
+        kind = "batch"
+    elif isinstance(payload, dict) and payload.get("method") in ("mcp/call_tool", "mcp/list_tools"):
+        kind = payload["method"]
+    else:
+        kind = "other"
+    metrics.REQUESTS_IN_FLIGHT.inc()
+    started = time.perf_counter()
+    try:
+        with tracing.span("mcp.request", parent=tracing.extract(traceparent), kind=tracing.SERVER,
+                          attributes={"rpc.kind": kind}):
+            return await dispatch_payload(payload)
+    finally:
+        metrics.REQUESTS_IN_FLIGHT.dec()
+        metrics.REQUEST_LATENCY.labels(kind).observe(time.perf_counter() - started)
+
+async def dispatch_payload(payload):
+    """
+    Handle a single JSON-RPC request or a batch (JSON array) of them.
+    Returns None when there is nothing to send back, i.e. the payload held
+    only notifications (requests without an "id"), and ready-made bytes for
+    a single mcp/list_tools request.
+    """
+    if isinstance(payload, list):
+        return await handle_batch(payload)
+    if not isinstance(payload, dict):
+        return invalid_request()
+    if payload.get("method") == "mcp/list_tools" and "id" in payload:
+        return list_tools_response(payload["id"])
+    response = await handle_jsonrpc(payload)
+    return response if "id" in payload else None
+
+async def handle_batch(batch: list):
+    if not batch:
+        return invalid_request()
+    if len(batch) > MCP_MAX_BATCH_SIZE:
+        return invalid_request(f"Batch too large (max {MCP_MAX_BATCH_SIZE} requests)")
+
+    semaphore = asyncio.Semaphore(MCP_BATCH_CONCURRENCY)
+
+    async def run_one(item):
+        if not isinstance(item, dict):
+            return invalid_request()
+        async with semaphore:
+            try:
+                response = await handle_jsonrpc(item)
+            except Exception as exc:
+                logging.exception("MCP batch entry failed:")
+                response = internal_error(item, exc)
+        return response if "id" in item else None
+
+    # gather keeps request order, so responses line up with the batch.
+    responses = await asyncio.gather(*(run_one(item) for item in batch))
+    return [r for r in responses if r is not None] or None
+
+# --------------------------------------------------------------------
+# Startup / shutdown (run on the serving event loop)
+# --------------------------------------------------------------------
+async def startup():
+    # Resume delivery of notifications queued before a restart.
+    await OUTBOX.start()
+    await HEALTH.start()
+
+async def shutdown():
+    await HEALTH.stop()
+    await OUTBOX.stop()
+    await http_client.aclose()
+    TOOLS.shutdown()
+
+# --------------------------------------------------------------------
+# Background event loop (Flask compatibility mode)
+# --------------------------------------------------------------------
+# Flask views are synchronous, so coroutines are handed to one long-lived
+# loop running in a daemon thread instead of spinning up a loop per request.
+# Either way, every request, background task and metrics scrape runs on a
+# single serving event loop (uvicorn's, or this one), so the breakers,
+# limiters, caches and metrics they share need no locks.
+_loop = None
+_loop_lock = threading.Lock()
+LIVENESS_TIMEOUT = 2.0  # seconds the loop may take to run a no-op
+
+def get_background_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_loop.run_forever, name="mcp-event-loop", daemon=True
+            ).start()
+            asyncio.run_coroutine_threadsafe(startup(), _loop)
+    return _loop
+
+def run_coroutine(coro, timeout: float = None):
+    """Run a coroutine on the background loop and block until it finishes."""
+    return asyncio.run_coroutine_threadsafe(coro, get_background_loop()).result(timeout)
+
 # --------------------------------------------------------------------
 # Flask routes
 # --------------------------------------------------------------------
 @app.route("/", methods=["GET"])
 def root():
-    return (
-        "<h2>Flask + MCP Server</h2>"
-        "<p>Tools: get_weather(city), send_notification(notification_input)</p>"
-        "<p>POST JSON-RPC 2.0 requests to <code>/mcp</code>.</p>",
-        200,
-    )
+    return ROOT_HTML, 200
 
 @app.route("/health", methods=["GET"])
 def health():
     return jsonify({"status": "healthy"}), 200
 
+@app.route("/livez", methods=["GET"])
+def livez():
+    # Alive as long as the background loop still runs coroutines.
+    try:
+        run_coroutine(asyncio.sleep(0), timeout=LIVENESS_TIMEOUT)
+    except Exception:
+        return jsonify({"status": "event loop unresponsive"}), 503
+    return jsonify({"status": "alive"}), 200
+
+@app.route("/readyz", methods=["GET"])
+def readyz():
+    try:
+        ready, report = run_coroutine(readiness(), timeout=LIVENESS_TIMEOUT)
+    except Exception:
+        return jsonify({"status": "not ready", "detail": "event loop unresponsive"}), 503
+    return jsonify(report), 200 if ready else 503
+
+@app.route("/metrics", methods=["GET"])
+def metrics_http():
+    return app.response_class(run_coroutine(render_metrics()), content_type=metrics.CONTENT_TYPE)
+
 @app.route("/tools", methods=["GET"])
 def list_tools_http():
-    loop = asyncio.new_event_loop()
-    tools = loop.run_until_complete(list_tools())
-    loop.close()
-    return jsonify([tool.model_dump() for tool in tools]), 200
+    if etag_matches(request.headers.get("If-None-Match"), TOOLS.catalog_etag()):
+        return app.response_class(status=304, headers=tools_headers())
+    return app.response_class(
+        TOOLS.catalog_json(), status=200, mimetype="application/json", headers=tools_headers()
+    )
 
 @app.route("/mcp", methods=["GET", "POST"])
 def mcp_http_handler():
     if request.method == "GET":
-        return jsonify({
-            "message": "MCP endpoint active. Use POST for JSON-RPC calls.",
-            "example": {
-                "method": "mcp/call_tool",
-                "params": {"tool": "get_weather", "arguments": {"city": "Chennai"}}
-            }
-        }), 200
+        return jsonify(MCP_USAGE), 200
 
     try:
         payload = request.get_json(force=True)
     except Exception:
-        return jsonify({
-            "jsonrpc": "2.0",
-            "error": {"code": -32700, "message": "Invalid JSON"},
-            "id": None
-        }), 400
-
-    async def handle():
-        # explicitly run the tool
-        method = payload.get("method")
-        if method == "mcp/call_tool":
-            params = payload.get("params", {})
-            tool = params.get("tool")
-            args = params.get("arguments", {})
-
-            if tool == "get_weather":
-                result_text = get_weather(args.get("city", ""))
-            elif tool == "send_notification":
-                result_text = send_notification(args.get("notification_input", ""))
-            else:
-                result_text = f"Unknown tool '{tool}'"
-
-            return {
-                "jsonrpc": "2.0",
-                "id": payload.get("id"),
-                "result": {
-                    "content": [
-                        {"type": "text", "text": result_text}
-                    ]
-                }
-            }
+        return jsonify(parse_error()), 400
 
-        elif method == "mcp/list_tools":
-            tools = await list_tools()
-            return {
-                "jsonrpc": "2.0",
-                "id": payload.get("id"),
-                "result": {"tools": [tool.model_dump() for tool in tools]}
-            }
+    try:
+        response = run_coroutine(handle_payload(payload, request.headers.get("traceparent")))
+        if response is None:
+            return "", 204
+        if isinstance(response, bytes):
+            return app.response_class(response, mimetype="application/json")
+        headers = overload_headers(response)
+        return jsonify(response), response_status(response, headers), headers
+    except Exception as exc:
+        logging.exception("MCP request failed:")
+        return jsonify(internal_error(payload, exc)), 500
 
-        else:
-            return {
-                "jsonrpc": "2.0",
-                "id": payload.get("id"),
-                "error": {"code": -32601, "message": "Unknown method"}
-            }
+# --------------------------------------------------------------------
+# ASGI routes (same route table, served on a single event loop)
+# --------------------------------------------------------------------
+async def asgi_root(request: Request) -> Response:
+    return HTMLResponse(ROOT_HTML)
+
+async def asgi_health(request: Request) -> Response:
+    return JSONResponse({"status": "healthy"})
+
+async def asgi_livez(request: Request) -> Response:
+    # Answering at all means the loop is running.
+    return JSONResponse({"status": "alive"})
+
+async def asgi_readyz(request: Request) -> Response:
+    ready, report = await readiness()
+    return JSONResponse(report, status_code=200 if ready else 503)
+
+async def asgi_metrics(request: Request) -> Response:
+    return Response(await render_metrics(), headers={"Content-Type": metrics.CONTENT_TYPE})
+
+async def asgi_list_tools(request: Request) -> Response:
+    if etag_matches(request.headers.get("if-none-match"), TOOLS.catalog_etag()):
+        return Response(status_code=304, headers=tools_headers())
+    return Response(TOOLS.catalog_json(), media_type="application/json", headers=tools_headers())
+
+async def asgi_mcp_handler(request: Request) -> Response:
+    if request.method == "GET":
+        return JSONResponse(MCP_USAGE)
+
+    try:
+        payload = await request.json()
+    except Exception:
+        return JSONResponse(parse_error(), status_code=400)
 
     try:
-        response = asyncio.run(handle())
-        return jsonify(response)
+        response = await handle_payload(payload, request.headers.get("traceparent"))
+        if response is None:
+            return Response(status_code=204)
+        if isinstance(response, bytes):
+            return Response(response, media_type="application/json")
+        headers = overload_headers(response)
+        return JSONResponse(response, status_code=response_status(response, headers), headers=headers)
     except Exception as exc:
-        import traceback; traceback.print_exc()
-        return jsonify({
-            "jsonrpc": "2.0",
-            "id": payload.get("id"),
-            "error": {"code": -32000, "message": f"Internal Server Error: {exc}"}
-        }), 500
+        logging.exception("MCP request failed:")
+        return JSONResponse(internal_error(payload, exc), status_code=500)
+
+@contextlib.asynccontextmanager
+async def lifespan(app: Starlette):
+    await startup()
+    yield
+    await shutdown()
+
+asgi_app = Starlette(lifespan=lifespan, routes=[
+    Route("/", asgi_root, methods=["GET"]),
+    Route("/health", asgi_health, methods=["GET"]),
+    Route("/livez", asgi_livez, methods=["GET"]),
+    Route("/readyz", asgi_readyz, methods=["GET"]),
+    Route("/metrics", asgi_metrics, methods=["GET"]),
+    Route("/tools", asgi_list_tools, methods=["GET"]),
+    Route("/mcp", asgi_mcp_handler, methods=["GET", "POST"]),
+])
 
 # --------------------------------------------------------------------
 # Entry point
 # --------------------------------------------------------------------
 if __name__ == "__main__":
-    logging.info("Starting Flask MCP Server on http://localhost:9000")
-    app.run(host="0.0.0.0", port=9000)
+    parser = argparse.ArgumentParser(description="Flask + MCP Server")
+    parser.add_argument(
+        "--mode",
+        choices=["flask", "asgi"],
+        default=os.getenv("MCP_SERVER_MODE", "flask"),
+        help="'asgi' serves the app with uvicorn on one event loop; "
+             "'flask' keeps the threaded Flask server (compatibility mode).",
+    )
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.getenv("MCP_SERVER_PORT", "9000")))
+    cli = parser.parse_args()
+
+    logging.info(f"Starting MCP Server ({cli.mode}) on http://localhost:{cli.port}")
+    if cli.mode == "asgi":
+        import uvicorn
+        uvicorn.run(asgi_app, host=cli.host, port=cli.port)
+    else:
+        get_background_loop()  # start background workers before the first request
+        app.run(host=cli.host, port=cli.port)
@@ -0,0 +1,237 @@
+"""
+Metrics
+-------
+Minimal Prometheus text-format metrics for the MCP server.
+- Counter, Gauge and Histogram with optional labels; one child per label set
+- Histogram buckets are preallocated per child, so observe() is one bisect
+  and two additions
+- Callback metrics read existing stats (cache, executor, loop) at scrape time
+- No locks, as updates and scrapes share one loop (see mcp_server.py)
+
+Metric objects used across modules are declared at the bottom of this file.
+"""
+
+import asyncio
+import math
+from bisect import bisect_left
+from typing import Callable, Optional
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+# --------------------------------------------------------------------
+# Metric types
+# --------------------------------------------------------------------
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+class _HistogramChild:
+    __slots__ = ("upper_bounds", "counts", "sum")
+
+    def __init__(self, upper_bounds: tuple):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)  # last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.upper_bounds, value)] += 1
+        self.sum += value
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (),
+                 registry: Optional["Registry"] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple, object] = {}
+        if not self.labelnames:
+            self._default = self._children[()] = self._new_child()
+        (registry or REGISTRY).register(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """Child for one label set, created on first use."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def samples(self):
+        """Yield (suffix, label string, value) for the exposition."""
+        for values, child in self._children.items():
+            yield "", _format_labels(self.labelnames, values), child.value
+
+class Counter(Metric):
+    type = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self._default.inc(amount)
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def inc(self, amount: float = 1.0):
+        self._default.inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._default.dec(amount)
+
+    def set(self, value: float):
+        self._default.set(value)
+
+    @property
+    def value(self) -> float:
+        return self._default.value
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (),
+                 buckets: tuple = DEFAULT_BUCKETS, registry: Optional["Registry"] = None):
+        self.upper_bounds = tuple(sorted(b for b in buckets if b != math.inf))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.upper_bounds)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def samples(self):
+        bounds = (*self.upper_bounds, math.inf)
+        for values, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(bounds, child.counts):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                yield "_bucket", _format_labels(self.labelnames, values, le), cumulative
+            yield "_sum", _format_labels(self.labelnames, values), child.sum
+            yield "_count", _format_labels(self.labelnames, values), cumulative
+
+class CallbackMetric(Metric):
+    """
+    Value(s) read at scrape time: `fn()` returns a number, or a dict of
+    label-value tuples -> number when `labelnames` are given.
+    """
+
+    def __init__(self, name: str, documentation: str, fn: Callable, type: str = "gauge",
+                 labelnames: tuple = (), registry: Optional["Registry"] = None):
+        self.fn = fn
+        self.type = type
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return None
+
+    def samples(self):
+        values = self.fn()
+        if not self.labelnames:
+            values = {(): values}
+        for label_values, value in values.items():
+            yield "", _format_labels(self.labelnames, label_values), value
+
+# --------------------------------------------------------------------
+# Registry
+# --------------------------------------------------------------------
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> bytes:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for suffix, labels, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{labels} {_format_value(value)}")
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+REGISTRY = Registry()
+
+# --------------------------------------------------------------------
+# Shared metrics
+# --------------------------------------------------------------------
+TOOL_CALLS = Counter("mcp_tool_calls_total", "Tool calls started.", ("tool",))
+TOOL_ERRORS = Counter("mcp_tool_errors_total", "Tool calls that raised.", ("tool",))
+TOOL_REJECTIONS = Counter("mcp_tool_rejected_total", "Tool calls shed by the adaptive limiter.",
+                          ("tool",))
+TOOL_LATENCY = Histogram("mcp_tool_duration_seconds", "Tool call latency, including queueing.",
+                         ("tool",))
+
+REQUESTS_IN_FLIGHT = Gauge("mcp_requests_in_flight", "JSON-RPC payloads being handled.")
+REQUEST_LATENCY = Histogram("mcp_request_duration_seconds",
+                            "JSON-RPC payload latency (a batch counts once).", ("kind",))
+
+UPSTREAM_LATENCY = Histogram("mcp_upstream_request_duration_seconds",
+                             "Upstream HTTP request latency.", ("upstream", "status"))
+
+def _loop_ready_callbacks() -> int:
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return 0
+    # Callbacks scheduled but not yet run: a direct measure of loop backlog.
+    ready = getattr(loop, "_ready", None)
+    return len(ready) if ready is not None else 0
+
+def _loop_tasks() -> int:
+    try:
+        return len(asyncio.all_tasks())
+    except RuntimeError:
+        return 0
+
+EVENT_LOOP_READY = CallbackMetric("mcp_event_loop_ready_callbacks",
+                                  "Callbacks waiting to run on the event loop.", _loop_ready_callbacks)
+EVENT_LOOP_TASKS = CallbackMetric("mcp_event_loop_tasks", "Pending asyncio tasks.", _loop_tasks)
+
+def status_class(status) -> str:
+    """200 -> '2xx'; anything that is not an HTTP status (e.g. 'error') passes through."""
+    return f"{status // 100}xx" if isinstance(status, int) else str(status)
@@ -0,0 +1,284 @@
+"""
+Mock Upstreams
+--------------
+Deterministic local stand-ins for every service the code talks to:
+- OpenWeatherMap: GET /data/2.5/weather (q= or id=) and GET /data/2.5/group
+- ntfy: POST /{topic}
+- Ollama: POST /api/generate and /api/chat, streamed (NDJSON) or not
+- OTLP collector: POST /v1/traces (OTLP/HTTP JSON); GET /_traces lists the
+  most recent spans received
+Each service has its own latency distribution, error rate and rate limit
+(429 with Retry-After once its token bucket is empty). Random draws come
+from a seeded generator per service, and weather data is derived from the
+city name, so runs are reproducible. GET /_stats returns per-service counts.
+
+Configuration (environment, all optional):
+    MOCK_SEED=42
+    MOCK_WEATHER_LATENCY=fixed:20         # ms: fixed:M | uniform:LO:HI | normal:MEAN:SD
+    MOCK_NTFY_LATENCY=exponential:15      #     exponential:MEAN | lognormal:MEDIAN:SIGMA
+    MOCK_OLLAMA_LATENCY=fixed:50          # time to first token
+    MOCK_OLLAMA_TOKEN_LATENCY=fixed:5     # between streamed chunks
+    MOCK_<SERVICE>_ERROR_RATE=0.0         # fraction answered with HTTP 500
+    MOCK_<SERVICE>_RATE_LIMIT=0           # requests/second, 0 = unlimited
+    MOCK_OLLAMA_REPLY='...'               # text the model "generates"
+
+Run, then point the code at it:
+    python mock_upstreams.py --port 8765
+    OPENWEATHER_BASE_URL=http://127.0.0.1:8765 NTFY_BASE_URL=http://127.0.0.1:8765 \\
+        python mcp_server.py --mode asgi
+    OLLAMA_BASE_URL=http://127.0.0.1:8765 python Connector.py
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import time
+import zlib
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+SERVICES = ("weather", "ntfy", "ollama")
+MOCK_UNKNOWN_CITIES = {"nowhere", "atlantis"}  # answered with OpenWeatherMap's 404
+MOCK_DEFAULT_REPLY = 'Checking the weather. {"name": "get_weather", "arguments": {"city": "Chennai"}}'
+MOCK_CHUNK_CHARS = 8
+MOCK_TRACE_BUFFER = 1000  # spans kept for GET /_traces
+DESCRIPTIONS = ["clear sky", "few clouds", "scattered clouds", "overcast clouds",
+                "mist", "light rain", "moderate rain", "thunderstorm"]
+
+# --------------------------------------------------------------------
+# Latency distributions
+# --------------------------------------------------------------------
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """
+    'lognormal:20:0.5' -> function drawing a delay in seconds. Parameters
+    are milliseconds except lognormal's sigma. Negative draws become 0.
+    """
+    kind, *raw = spec.strip().split(":")
+    try:
+        args = [float(a) for a in raw]
+        if kind == "fixed":
+            (ms,) = args
+            draw = lambda rng: ms
+        elif kind == "uniform":
+            lo, hi = args
+            draw = lambda rng: rng.uniform(lo, hi)
+        elif kind == "normal":
+            mean, sd = args
+            draw = lambda rng: rng.gauss(mean, sd)
+        elif kind == "exponential":
+            (mean,) = args
+            draw = lambda rng: rng.expovariate(1 / mean) if mean > 0 else 0.0
+        elif kind == "lognormal":
+            median, sigma = args
+            draw = lambda rng: rng.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+        else:
+            raise ValueError(f"unknown distribution '{kind}'")
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Bad latency spec '{spec}': {e}") from None
+    return lambda rng: max(0.0, draw(rng)) / 1000
+
+# --------------------------------------------------------------------
+# Per-service behaviour
+# --------------------------------------------------------------------
+class TokenBucket:
+    """`rate` requests/second with bursts of up to `rate` requests."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+@dataclass
+class Upstream:
+    name: str
+    latency: str = "fixed:20"
+    error_rate: float = 0.0
+    rate_limit: float = 0.0
+    seed: int = 42
+    stats: dict = field(default_factory=lambda: {"requests": 0, "errors": 0, "rate_limited": 0})
+
+    def __post_init__(self):
+        self.delay = parse_latency(self.latency)
+        # crc32 rather than hash(): string hashes are salted per process.
+        self.rng = random.Random(self.seed + zlib.crc32(self.name.encode()))
+        self.bucket = TokenBucket(self.rate_limit) if self.rate_limit > 0 else None
+
+    @classmethod
+    def from_env(cls, name: str, seed: int, latency: str) -> "Upstream":
+        prefix = f"MOCK_{name.upper()}_"
+        return cls(
+            name=name,
+            latency=os.getenv(prefix + "LATENCY", latency),
+            error_rate=float(os.getenv(prefix + "ERROR_RATE", "0")),
+            rate_limit=float(os.getenv(prefix + "RATE_LIMIT", "0")),
+            seed=seed,
+        )
+
+    async def admit(self):
+        """
+        Count the request, sleep for its latency and return an error
+        response to send instead of the real one, or None.
+        """
+        self.stats["requests"] += 1
+        if self.bucket is not None and not self.bucket.take():
+            self.stats["rate_limited"] += 1
+            retry_after = max(1, math.ceil(1 / self.rate_limit))
+            return JSONResponse({"cod": 429, "message": "rate limit exceeded"},
+                                status_code=429, headers={"Retry-After": str(retry_after)})
+        await asyncio.sleep(self.delay(self.rng))
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self.stats["errors"] += 1
+            return JSONResponse({"cod": 500, "message": "injected failure"}, status_code=500)
+        return None
+
+# --------------------------------------------------------------------
+# App
+# --------------------------------------------------------------------
+def weather_record(city_id: int, name: str) -> dict:
+    """Stable fake conditions for a city, in OpenWeatherMap's response shape."""
+    digest = zlib.crc32(name.lower().encode("utf-8"))
+    return {
+        "id": city_id,
+        "name": name,
+        "main": {"temp": round(-5 + digest % 400 / 10, 1), "humidity": digest % 100},
+        "weather": [{"description": DESCRIPTIONS[digest % len(DESCRIPTIONS)]}],
+        "cod": 200,
+    }
+
+def create_app(seed: int = None, ollama_reply: str = None) -> Starlette:
+    seed = int(os.getenv("MOCK_SEED", "42")) if seed is None else seed
+    reply = ollama_reply or os.getenv("MOCK_OLLAMA_REPLY", MOCK_DEFAULT_REPLY)
+    upstreams = {
+        "weather": Upstream.from_env("weather", seed, "fixed:20"),
+        "ntfy": Upstream.from_env("ntfy", seed, "fixed:20"),
+        "ollama": Upstream.from_env("ollama", seed, "fixed:50"),
+    }
+    token_delay = parse_latency(os.getenv("MOCK_OLLAMA_TOKEN_LATENCY", "fixed:5"))
+
+    async def weather(request: Request) -> Response:
+        error = await upstreams["weather"].admit()
+        if error is not None:
+            return error
+        params = request.query_params
+        if "id" in params:
+            return JSONResponse(weather_record(int(params["id"]), f"City {params['id']}"))
+        city = params.get("q", "").split(",")[0].strip()
+        if not city or city.lower() in MOCK_UNKNOWN_CITIES:
+            return JSONResponse({"cod": "404", "message": "city not found"}, status_code=404)
+        city_id = zlib.crc32(city.lower().encode("utf-8")) % 10_000_000
+        return JSONResponse(weather_record(city_id, city.title()))
+
+    async def weather_group(request: Request) -> Response:
+        error = await upstreams["weather"].admit()
+        if error is not None:
+            return error
+        ids = [int(i) for i in request.query_params.get("id", "").split(",") if i]
+        return JSONResponse({"cnt": len(ids), "list": [weather_record(i, f"City {i}") for i in ids]})
+
+    async def ntfy(request: Request) -> Response:
+        body = await request.body()
+        error = await upstreams["ntfy"].admit()
+        if error is not None:
+            return error
+        return JSONResponse({
+            "id": f"{zlib.crc32(body):08x}",
+            "time": int(time.time()),
+            "event": "message",
+            "topic": request.path_params["topic"],
+            "message": body.decode("utf-8", "replace"),
+        })
+
+    async def ollama(request: Request) -> Response:
+        body = await request.json()
+        upstream = upstreams["ollama"]
+        error = await upstream.admit()
+        if error is not None:
+            return error
+        chat = request.url.path == "/api/chat"
+        model = body.get("model", "mock")
+
+        def chunk(text: str, done: bool) -> dict:
+            message = {"model": model, "done": done}
+            if chat:
+                message["message"] = {"role": "assistant", "content": text}
+            else:
+                message["response"] = text
+            if done:
+                message["eval_count"] = math.ceil(len(reply) / MOCK_CHUNK_CHARS)
+                if not chat:
+                    message["context"] = [1, 2, 3]
+            return message
+
+        if not body.get("stream", True):
+            return JSONResponse(chunk(reply, True))
+
+        async def tokens():
+            for i in range(0, len(reply), MOCK_CHUNK_CHARS):
+                yield json.dumps(chunk(reply[i:i + MOCK_CHUNK_CHARS], False)) + "\n"
+                await asyncio.sleep(token_delay(upstream.rng))
+            yield json.dumps(chunk("", True)) + "\n"
+        return StreamingResponse(tokens(), media_type="application/x-ndjson")
+
+    spans: deque = deque(maxlen=MOCK_TRACE_BUFFER)
+    trace_stats = {"exports": 0, "spans": 0}
+
+    async def otlp_traces(request: Request) -> Response:
+        body = await request.json()
+        trace_stats["exports"] += 1
+        for resource in body.get("resourceSpans", []):
+            service = next((a["value"].get("stringValue") for a in resource.get("resource", {})
+                            .get("attributes", []) if a.get("key") == "service.name"), None)
+            for scope in resource.get("scopeSpans", []):
+                for span in scope.get("spans", []):
+                    trace_stats["spans"] += 1
+                    spans.append({**span, "service": service})
+        return JSONResponse({"partialSuccess": {}})
+
+    async def traces(request: Request) -> Response:
+        return JSONResponse(list(spans))
+
+    async def stats(request: Request) -> Response:
+        return JSONResponse({**{name: u.stats for name, u in upstreams.items()}, "traces": trace_stats})
+
+    return Starlette(routes=[
+        Route("/data/2.5/weather", weather, methods=["GET"]),
+        Route("/data/2.5/group", weather_group, methods=["GET"]),
+        Route("/api/generate", ollama, methods=["POST"]),
+        Route("/api/chat", ollama, methods=["POST"]),
+        Route("/v1/traces", otlp_traces, methods=["POST"]),
+        Route("/_traces", traces, methods=["GET"]),
+        Route("/_stats", stats, methods=["GET"]),
+        Route("/{topic}", ntfy, methods=["POST"]),
+    ])
+
+# --------------------------------------------------------------------
+# Entry point
+# --------------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock OpenWeatherMap, ntfy and Ollama.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=int(os.getenv("MOCK_PORT", "8765")))
+    parser.add_argument("--seed", type=int, default=None, help="overrides MOCK_SEED")
+    cli = parser.parse_args()
+
+    import uvicorn
+    print(f"🧪 Mock upstreams on http://{cli.host}:{cli.port}")
+    uvicorn.run(create_app(cli.seed), host=cli.host, port=cli.port, log_level="warning")
@@ -0,0 +1,304 @@
+"""
+Notification Outbox
+-------------------
+Durable queue between the send_notification tool and ntfy.
+- Messages are written to SQLite before the tool returns, with an ID that
+  can be looked up later
+- Duplicate suppression: the same message to the same topic within
+  NOTIFY_DEDUP_WINDOW seconds is not queued twice
+- Digest coalescing: a topic's messages are held for NOTIFY_COALESCE_WINDOW
+  seconds and then pushed together as one digest
+- A small pool of async workers drains the outbox
+- Pushes are rate-limited per topic; failures are retried with exponential
+  backoff until NOTIFY_MAX_ATTEMPTS, then marked failed; a push the sender
+  defers (e.g. ntfy's circuit is open) waits without using up an attempt
+- Messages left 'sending' by a crash are picked up again on start
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+NOTIFY_DB_PATH = os.getenv("NOTIFY_DB_PATH", "notifications.db")
+NOTIFY_WORKERS = int(os.getenv("NOTIFY_WORKERS", "2"))
+NOTIFY_BATCH_SIZE = int(os.getenv("NOTIFY_BATCH_SIZE", "10"))
+NOTIFY_MIN_INTERVAL = float(os.getenv("NOTIFY_MIN_INTERVAL", "1.0"))  # seconds between pushes per topic
+NOTIFY_MAX_ATTEMPTS = int(os.getenv("NOTIFY_MAX_ATTEMPTS", "5"))
+NOTIFY_BACKOFF = float(os.getenv("NOTIFY_BACKOFF", "2.0"))  # first retry delay, doubled per failure
+NOTIFY_POLL_INTERVAL = float(os.getenv("NOTIFY_POLL_INTERVAL", "1.0"))
+NOTIFY_DEDUP_WINDOW = float(os.getenv("NOTIFY_DEDUP_WINDOW", "600"))
+NOTIFY_COALESCE_WINDOW = float(os.getenv("NOTIFY_COALESCE_WINDOW", "5"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notifications (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    topic TEXT NOT NULL,
+    message TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',   -- pending | sending | sent | failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    sent_at REAL,
+    last_error TEXT,
+    dedup_key TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_notifications_due ON notifications (status, next_attempt_at);
+"""
+
+def dedup_key(topic: str, message: str) -> str:
+    return hashlib.sha256(f"{topic}\0{message}".encode("utf-8")).hexdigest()
+
+def digest(messages: list[str]) -> str:
+    """One push body for several messages to the same topic."""
+    if len(messages) == 1:
+        return messages[0]
+    return f"{len(messages)} updates:\n" + "\n".join(f"• {m}" for m in messages)
+
+class DeliveryDeferred(Exception):
+    """Raised by `send` when the push was not attempted; retry after `retry_after` seconds."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+class NotificationOutbox:
+    """
+    `send(topic, body)` is the coroutine that performs one push; it raises
+    on failure. All SQLite work runs on one dedicated thread, so the
+    connection is never shared between threads and never blocks the loop.
+    """
+
+    def __init__(self, send, path: str = NOTIFY_DB_PATH, workers: int = NOTIFY_WORKERS,
+                 batch_size: int = NOTIFY_BATCH_SIZE, min_interval: float = NOTIFY_MIN_INTERVAL,
+                 max_attempts: int = NOTIFY_MAX_ATTEMPTS, backoff: float = NOTIFY_BACKOFF,
+                 poll_interval: float = NOTIFY_POLL_INTERVAL,
+                 dedup_window: float = NOTIFY_DEDUP_WINDOW,
+                 coalesce_window: float = NOTIFY_COALESCE_WINDOW):
+        self._send = send
+        self.path = path
+        self.workers = workers
+        self.batch_size = batch_size
+        self.min_interval = min_interval
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.poll_interval = poll_interval
+        self.dedup_window = dedup_window
+        self.coalesce_window = coalesce_window
+        self._db_thread = ThreadPoolExecutor(1, thread_name_prefix="notify-db")
+        self._db = None
+        self._tasks: list[asyncio.Task] = []
+        self._wakeup = None
+        self._claim_lock = None
+        self._busy_topics: set[str] = set()
+        self._next_push: dict[str, float] = {}
+
+    # ----------------------------------------------------------------
+    # Database (runs on the notify-db thread)
+    # ----------------------------------------------------------------
+    async def _run_db(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._db_thread, fn, *args)
+
+    def _connect(self):
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.row_factory = sqlite3.Row
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(SCHEMA)
+            columns = {row["name"] for row in self._db.execute("PRAGMA table_info(notifications)")}
+            if "dedup_key" not in columns:  # outbox created before deduplication
+                self._db.execute("ALTER TABLE notifications ADD COLUMN dedup_key TEXT")
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_notifications_dedup "
+                "ON notifications (dedup_key, created_at)"
+            )
+        return self._db
+
+    def _recover(self):
+        db = self._connect()
+        with db:
+            db.execute("UPDATE notifications SET status = 'pending' WHERE status = 'sending'")
+
+    def _insert(self, topic: str, message: str) -> tuple[int, bool]:
+        db = self._connect()
+        now = time.time()
+        key = dedup_key(topic, message)
+        if self.dedup_window > 0:
+            row = db.execute(
+                "SELECT id FROM notifications WHERE dedup_key = ? AND created_at >= ? "
+                "AND status != 'failed' ORDER BY id DESC LIMIT 1",
+                (key, now - self.dedup_window),
+            ).fetchone()
+            if row is not None:
+                return row["id"], True
+        with db:
+            cur = db.execute(
+                "INSERT INTO notifications (topic, message, next_attempt_at, created_at, dedup_key) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (topic, message, now, now, key),
+            )
+        return cur.lastrowid, False
+
+    def _claim(self, blocked: list[str]):
+        """
+        Mark up to batch_size due messages of the most overdue free topic as
+        sending. A topic is ready once its oldest message has waited out the
+        coalescing window, or once a full batch is waiting.
+        """
+        db = self._connect()
+        now = time.time()
+        placeholders = ",".join("?" * len(blocked))
+        exclude = f"AND topic NOT IN ({placeholders})" if blocked else ""
+        row = db.execute(
+            "SELECT topic FROM notifications WHERE status = 'pending' AND next_attempt_at <= ? "
+            f"{exclude} GROUP BY topic "
+            "HAVING MIN(created_at) <= ? OR COUNT(*) >= ? "
+            "ORDER BY MIN(next_attempt_at) LIMIT 1",
+            (now, *blocked, now - self.coalesce_window, self.batch_size),
+        ).fetchone()
+        if row is None:
+            return None, []
+        topic = row["topic"]
+        rows = db.execute(
+            "SELECT id, message, attempts FROM notifications "
+            "WHERE status = 'pending' AND next_attempt_at <= ? AND topic = ? "
+            "ORDER BY id LIMIT ?",
+            (now, topic, self.batch_size),
+        ).fetchall()
+        with db:
+            db.executemany(
+                "UPDATE notifications SET status = 'sending' WHERE id = ?",
+                [(r["id"],) for r in rows],
+            )
+        return topic, [dict(r) for r in rows]
+
+    def _mark_sent(self, ids: list[int]):
+        db = self._connect()
+        with db:
+            db.executemany(
+                "UPDATE notifications SET status = 'sent', sent_at = ?, attempts = attempts + 1 "
+                "WHERE id = ?",
+                [(time.time(), i) for i in ids],
+            )
+
+    def _mark_failed(self, rows: list[dict], error: str):
+        db = self._connect()
+        now = time.time()
+        updates = []
+        for r in rows:
+            attempts = r["attempts"] + 1
+            status = "failed" if attempts >= self.max_attempts else "pending"
+            retry_at = now + self.backoff * 2 ** (attempts - 1)
+            updates.append((status, attempts, retry_at, error, r["id"]))
+        with db:
+            db.executemany(
+                "UPDATE notifications SET status = ?, attempts = ?, next_attempt_at = ?, "
+                "last_error = ? WHERE id = ?",
+                updates,
+            )
+
+    def _defer(self, ids: list[int], retry_after: float, reason: str):
+        db = self._connect()
+        with db:
+            db.executemany(
+                "UPDATE notifications SET status = 'pending', next_attempt_at = ?, last_error = ? "
+                "WHERE id = ?",
+                [(time.time() + retry_after, reason, i) for i in ids],
+            )
+
+    def _get(self, message_id: int):
+        row = self._connect().execute(
+            "SELECT * FROM notifications WHERE id = ?", (message_id,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def _depth(self) -> int:
+        return self._connect().execute(
+            "SELECT COUNT(*) FROM notifications WHERE status IN ('pending', 'sending')"
+        ).fetchone()[0]
+
+    # ----------------------------------------------------------------
+    # Public API (event loop)
+    # ----------------------------------------------------------------
+    async def enqueue(self, topic: str, message: str) -> tuple[int, bool]:
+        """
+        Persist a message; delivery happens later. Returns (message_id,
+        duplicate) where duplicate means an identical message to the same
+        topic was queued within the dedup window and its ID is returned.
+        """
+        message_id, duplicate = await self._run_db(self._insert, topic, message)
+        await self.start()
+        if not duplicate:
+            self._wakeup.set()
+        return message_id, duplicate
+
+    async def status(self, message_id: int):
+        return await self._run_db(self._get, message_id)
+
+    async def depth(self) -> int:
+        """Messages not yet delivered or given up on."""
+        return await self._run_db(self._depth)
+
+    async def start(self):
+        """Start the worker pool (idempotent); resumes messages left mid-send."""
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._claim_lock = asyncio.Lock()
+        self._tasks = [asyncio.get_running_loop().create_task(self._worker())
+                       for _ in range(self.workers)]
+        await self._run_db(self._recover)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    # ----------------------------------------------------------------
+    # Workers
+    # ----------------------------------------------------------------
+    async def _worker(self):
+        while True:
+            try:
+                delivered = await self._deliver_next()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logging.exception("Notification worker error:")
+                delivered = False
+            if not delivered:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _deliver_next(self) -> bool:
+        async with self._claim_lock:
+            now = time.monotonic()
+            blocked = self._busy_topics | {t for t, at in self._next_push.items() if at > now}
+            topic, rows = await self._run_db(self._claim, sorted(blocked))
+            if not rows:
+                return False
+            self._busy_topics.add(topic)
+
+        try:
+            body = digest([r["message"] for r in rows])
+            try:
+                await self._send(topic, body)
+            except DeliveryDeferred as e:
+                await self._run_db(self._defer, [r["id"] for r in rows], e.retry_after, str(e))
+            except Exception as e:
+                logging.warning(f"Notification push to '{topic}' failed: {e}")
+                await self._run_db(self._mark_failed, rows, str(e))
+            else:
+                await self._run_db(self._mark_sent, [r["id"] for r in rows])
+        finally:
+            self._next_push[topic] = time.monotonic() + self.min_interval
+            self._busy_topics.discard(topic)
+        return True
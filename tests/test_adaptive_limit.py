@@ -0,0 +1,72 @@
+import heapq
+import random
+
+import pytest
+
+from adaptive_limit import AdaptiveLimiter, Overloaded
+
+def simulate(rate: float, seconds: float, miss_ratio: float = 0.2, miss_latency: float = 0.3,
+             hit_latency: float = 0.001, warmup: float = 0.0,
+             seed: int = 1) -> tuple[AdaptiveLimiter, dict]:
+    """
+    Poisson arrivals of one tool mixing cache hits and upstream misses,
+    with service times that do not depend on load (no congestion). Calls
+    shed after `warmup` seconds are counted per priority.
+    """
+    now = [0.0]
+    limiter = AdaptiveLimiter(initial=32, min_limit=4, max_limit=512, backoff=0.9,
+                              tolerance=2.0, min_latency=0.25, enabled=True, clock=lambda: now[0])
+    rng = random.Random(seed)
+    events = []  # (time, order, started or None for an arrival)
+    t, order = 0.0, 0
+    while t < seconds:
+        t += rng.expovariate(rate)
+        events.append((t, order, None))
+        order += 1
+    heapq.heapify(events)
+    shed = {"normal": 0, "low": 0, "calls": 0}
+    while events:
+        now[0], _, started = heapq.heappop(events)
+        if started is not None:
+            limiter.release(started, key="get_weather")
+            continue
+        shed["calls"] += 1
+        priority = "low" if rng.random() < 0.2 else "normal"
+        try:
+            started = limiter.acquire(priority, "get_weather")
+        except Overloaded:
+            if now[0] >= warmup:
+                shed[priority] += 1
+            continue
+        latency = miss_latency if rng.random() < miss_ratio else hit_latency
+        heapq.heappush(events, (now[0] + latency, order, started))
+        order += 1
+    return limiter, shed
+
+def test_no_shedding_below_capacity():
+    # ~3 calls in flight against a limit of 32; 300 ms misses are normal for
+    # this tool and must not read as congestion.
+    limiter, shed = simulate(50, seconds=120)
+    assert shed == {"normal": 0, "low": 0, "calls": shed["calls"]}
+    assert limiter.limit >= 32
+
+@pytest.mark.parametrize("rate", [200, 400])
+def test_limit_grows_to_fit_steady_load(rate):
+    # Peaks above the initial limit's low-priority share may be shed while
+    # the limit ramps up, never once it has.
+    limiter, shed = simulate(rate, seconds=120, warmup=5)
+    assert shed["normal"] == 0 and shed["low"] == 0
+
+def test_backs_off_when_congested():
+    limiter, _ = simulate(50, seconds=60)
+    limit = limiter.limit
+    # The limit is in use and calls take far longer than this tool's p90.
+    started = [limiter.acquire("high", "get_weather") for _ in range(int(limit))]
+    clock = limiter._clock
+    limiter._clock = lambda: clock() + 5.0
+    for s in started:
+        limiter.release(s, key="get_weather")
+    assert limiter.limit == pytest.approx(limit * 0.9)
+    with pytest.raises(Overloaded):
+        for _ in range(int(limit)):
+            limiter.acquire("normal", "get_weather")
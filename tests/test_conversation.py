@@ -0,0 +1,12 @@
+from Connector import Conversation
+
+def test_history_keeps_whole_turns():
+    conversation = Conversation(system_prompt="sys", max_turns=2)
+    for turn in range(4):
+        conversation.add("user", f"u{turn}")
+        conversation.add("assistant", f"a{turn}")
+        conversation.add("tool", f"t{turn}")
+    messages = conversation.messages()
+    assert messages[0] == {"role": "system", "content": "sys"}
+    assert [m["content"] for m in messages[1:]] == ["u2", "a2", "t2", "u3", "a3", "t3"]
+    assert messages[1]["role"] == "user"
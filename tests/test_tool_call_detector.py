@@ -0,0 +1,27 @@
+import pytest
+
+from Connector import ToolCallDetector, extract_tool_calls
+
+WEATHER = '{"name":"get_weather","arguments":{"city":"Paris"}}'
+NOTIFY = '{"name":"send_notification","arguments":{"notification_input":"hi|t"}}'
+CALLS = [("get_weather", {"city": "Paris"}), ("send_notification", {"notification_input": "hi|t"})]
+
+@pytest.mark.parametrize("text", [
+    f"{WEATHER}\n{NOTIFY}",
+    f"[{WEATHER}, {NOTIFY}]",
+    f'{{"tool_calls":[{WEATHER},{NOTIFY}]}}',          # wrapper object
+    f"Doing both:{{ first {WEATHER} then {NOTIFY}",     # stray unclosed brace
+    f'{{ he said "hi }} {WEATHER} {NOTIFY}',             # stray quote in prose
+])
+def test_finds_every_call(text):
+    assert extract_tool_calls(text) == CALLS
+    for size in (1, 3, 7):
+        detector = ToolCallDetector()
+        found = []
+        for i in range(0, len(text), size):
+            found += detector.feed(text[i:i + size])
+        assert found == CALLS
+
+def test_call_inside_arguments_is_not_split_out():
+    text = '{"name":"a","arguments":{"x":{"name":"b","arguments":{}}}}'
+    assert extract_tool_calls(text) == [("a", {"x": {"name": "b", "arguments": {}}})]
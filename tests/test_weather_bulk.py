@@ -0,0 +1,63 @@
+import asyncio
+import os
+
+os.environ["CITY_INDEX_PATH"] = ""
+os.environ.setdefault("WEATHER_API_KEY", "test")
+
+import mcp_server  # noqa: E402
+
+def record(city_id: int, name: str) -> dict:
+    return {"id": city_id, "name": name, "main": {"temp": 20.0},
+            "weather": [{"description": "clear sky"}]}
+
+def test_bulk_queries_sharing_an_id(monkeypatch):
+    """'London' and 'London,GB' (or 'Madras' and 'Chennai') resolve to one ID."""
+    mcp_server.WEATHER_CACHE.clear()
+    mcp_server.CITY_IDS.clear()
+    for key, city_id in {"london": 2643743, "london,gb": 2643743,
+                         "chennai": 1264527, "madras": 1264527}.items():
+        mcp_server.CITY_IDS.set(key, city_id)
+    groups = []
+
+    async def fetch_weather_group(city_ids, api_key):
+        groups.append(list(city_ids))
+        return {i: record(i, f"City {i}") for i in city_ids}
+
+    async def fetch_weather_once(query, api_key):
+        raise AssertionError(f"unexpected single lookup for {query.key}")
+
+    monkeypatch.setattr(mcp_server, "fetch_weather_group", fetch_weather_group)
+    monkeypatch.setattr(mcp_server, "fetch_weather_once", fetch_weather_once)
+
+    cities = ["London", "London,GB", "Chennai", "Madras"]
+    lines = asyncio.run(mcp_server.get_weather_bulk(cities)).splitlines()
+
+    assert groups == [[2643743, 1264527]]
+    assert [line.split(" is ")[0] for line in lines] == [
+        f"The current temperature in {city}" for city in cities
+    ]
+
+def test_failed_group_request_skips_single_lookups(monkeypatch):
+    """A throttled group request must not turn into one request per city."""
+    mcp_server.WEATHER_CACHE.clear()
+    mcp_server.CITY_IDS.clear()
+    cities = [f"City {i}" for i in range(25)]
+    for i, city in enumerate(cities):
+        mcp_server.CITY_IDS.set(city.lower(), 1000 + i)
+    error = "⚠️ OpenWeatherMap is unavailable (HTTP 429)"
+    groups = []
+
+    async def fetch_weather_group(city_ids, api_key):
+        groups.append(list(city_ids))
+        raise mcp_server.WeatherUnavailable(error)
+
+    async def fetch_weather_once(query, api_key):
+        raise AssertionError(f"unexpected single lookup for {query.key}")
+
+    monkeypatch.setattr(mcp_server, "fetch_weather_group", fetch_weather_group)
+    monkeypatch.setattr(mcp_server, "fetch_weather_once", fetch_weather_once)
+
+    lines = asyncio.run(mcp_server.get_weather_bulk(cities)).splitlines()
+
+    assert len(groups) == 2
+    assert lines == [error] * len(cities)
@@ -0,0 +1,227 @@
+"""
+Tool Registry
+-------------
+Single place where MCP tools are declared. Each tool's handler, input schema
+and description are registered once with a decorator, and every transport
+(MCP call_tool, /mcp JSON-RPC, /tools) dispatches through the same registry.
+- O(1) dispatch by tool name
+- Tool catalog built and serialized once per registry version, with a
+  strong ETag derived from the serialized bytes
+- Native async tools run on the event loop; sync tools run in a bounded
+  thread pool (TOOL_EXECUTOR_WORKERS) so they never block it
+- Optional per-tool concurrency limits with queued / running counters
+- Optional adaptive limiter (adaptive_limit.py) shedding calls by tool priority
+- Per-tool call, error and latency metrics (see metrics.py)
+"""
+
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from mcp.types import Tool
+
+from adaptive_limit import AdaptiveLimiter, Overloaded
+from metrics import TOOL_CALLS, TOOL_ERRORS, TOOL_LATENCY, TOOL_REJECTIONS
+
+class UnknownToolError(LookupError):
+    """No tool is registered under the requested name."""
+
+# Value passed for a declared argument the caller left out.
+_EMPTY_ARGUMENT = {"array": list, "object": dict}
+
+TOOL_EXECUTOR_WORKERS = int(os.getenv("TOOL_EXECUTOR_WORKERS", "16"))
+
+@dataclass(frozen=True)
+class ToolSpec:
+    name: str
+    handler: Callable
+    description: str
+    input_schema: dict
+    is_async: bool
+    max_concurrency: Optional[int] = None
+    priority: str = "normal"  # see adaptive_limit.PRIORITY_SHARE
+
+    def bind(self, arguments: dict) -> dict:
+        """Map JSON arguments onto handler keyword arguments."""
+        arguments = arguments or {}
+        properties = self.input_schema.get("properties", {})
+        return {
+            param: arguments[param] if param in arguments
+            else _EMPTY_ARGUMENT.get(schema.get("type"), str)()
+            for param, schema in properties.items()
+        }
+
+    def to_tool(self) -> Tool:
+        return Tool(name=self.name, description=self.description, inputSchema=self.input_schema)
+
+@dataclass
+class ToolStats:
+    queued: int = 0    # waiting for a per-tool concurrency slot
+    running: int = 0
+    calls: int = 0
+
+class ToolRegistry:
+    def __init__(self, max_workers: int = TOOL_EXECUTOR_WORKERS,
+                 limiter: Optional[AdaptiveLimiter] = None):
+        self._tools: dict[str, ToolSpec] = {}
+        self.limiter = limiter
+        self._stats: dict[str, ToolStats] = {}
+        self._limits: dict[str, asyncio.Semaphore] = {}
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.version = 0
+        self._catalog_version = -1
+        self._tool_models: list[Tool] = []
+        self._catalog: list[dict] = []
+        self._catalog_json = b"[]"
+        self._catalog_etag = ""
+
+    def tool(self, name: str, description: str, input_schema: dict,
+             max_concurrency: Optional[int] = None, priority: str = "normal"):
+        """
+        Decorator registering `handler` as the tool `name`. At most
+        `max_concurrency` calls of it run at once; the rest wait their turn.
+        Under overload, lower-`priority` tools are shed first.
+        """
+        def register(handler):
+            self._tools[name] = ToolSpec(
+                name=name,
+                handler=handler,
+                description=description,
+                input_schema=input_schema,
+                is_async=inspect.iscoroutinefunction(handler),
+                max_concurrency=max_concurrency,
+                priority=priority,
+            )
+            self._stats[name] = ToolStats()
+            if max_concurrency:
+                self._limits[name] = asyncio.Semaphore(max_concurrency)
+            else:
+                self._limits.pop(name, None)
+            self.version += 1
+            return handler
+        return register
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._tools
+
+    def names(self) -> list[str]:
+        return list(self._tools)
+
+    def get(self, name: str) -> ToolSpec:
+        try:
+            return self._tools[name]
+        except (KeyError, TypeError):
+            raise UnknownToolError(name) from None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="mcp-tool")
+        return self._executor
+
+    async def run_blocking(self, fn, *args, **kwargs):
+        """Run a blocking callable in the tool thread pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+
+    async def call(self, name: str, arguments: dict) -> str:
+        """Run a tool; raises UnknownToolError, or Overloaded when shed."""
+        spec = self.get(name)
+        kwargs = spec.bind(arguments)
+        stats = self._stats[name]
+        limit = self._limits.get(name)
+        started = time.perf_counter()
+        TOOL_CALLS.labels(name).inc()
+        failed = False
+
+        if limit is not None:
+            stats.queued += 1
+            try:
+                await limit.acquire()
+            finally:
+                stats.queued -= 1
+        # The limiter slot is taken once the per-tool slot is held, so time
+        # queued behind a tool's own limit neither holds limiter capacity
+        # nor counts as latency.
+        admitted = None
+        if self.limiter is not None:
+            try:
+                admitted = self.limiter.acquire(spec.priority, name)
+            except Overloaded:
+                if limit is not None:
+                    limit.release()
+                TOOL_REJECTIONS.labels(name).inc()
+                raise
+        stats.running += 1
+        stats.calls += 1
+        try:
+            if spec.is_async:
+                return await spec.handler(**kwargs)
+            return await self.run_blocking(spec.handler, **kwargs)
+        except BaseException as e:
+            if isinstance(e, Exception):
+                TOOL_ERRORS.labels(name).inc()
+            failed = True  # errors and cancellations say nothing about capacity
+            raise
+        finally:
+            stats.running -= 1
+            if limit is not None:
+                limit.release()
+            if admitted is not None:
+                self.limiter.release(admitted, dropped=failed, key=name)
+            TOOL_LATENCY.labels(name).observe(time.perf_counter() - started)
+
+    def stats(self) -> dict:
+        """Executor queue depth plus queued / running counts per tool."""
+        executor = self._executor
+        return {
+            "executor": {
+                "workers": self.max_workers,
+                "threads": len(executor._threads) if executor else 0,
+                "queue_depth": executor._work_queue.qsize() if executor else 0,
+            },
+            "tools": {name: vars(stats).copy() for name, stats in self._stats.items()},
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    # ----------------------------------------------------------------
+    # Catalog (rebuilt only when a tool is registered)
+    # ----------------------------------------------------------------
+    def _refresh_catalog(self):
+        if self._catalog_version == self.version:
+            return
+        self._tool_models = [spec.to_tool() for spec in self._tools.values()]
+        self._catalog = [tool.model_dump() for tool in self._tool_models]
+        self._catalog_json = json.dumps(self._catalog, separators=(",", ":")).encode("utf-8")
+        digest = hashlib.sha256(self._catalog_json).hexdigest()[:32]
+        self._catalog_etag = f'"tools-v{self.version}-{digest}"'
+        self._catalog_version = self.version
+
+    def tools(self) -> list[Tool]:
+        self._refresh_catalog()
+        return self._tool_models
+
+    def catalog(self) -> list[dict]:
+        self._refresh_catalog()
+        return self._catalog
+
+    def catalog_json(self) -> bytes:
+        self._refresh_catalog()
+        return self._catalog_json
+
+    def catalog_etag(self) -> str:
+        """Quoted strong ETag of catalog_json()."""
+        self._refresh_catalog()
+        return self._catalog_etag
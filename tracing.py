@@ -0,0 +1,316 @@
+"""
+Tracing
+-------
+Lightweight OpenTelemetry-compatible tracing shared by Connector.py and the
+MCP server (standard library only, so both sides can import it).
+- W3C trace context: `traceparent` is sent as an HTTP header and, for
+  JSON-RPC requests, in params._meta so each batch entry carries its own
+- Spans nest through contextvars, so they follow both threads and asyncio
+  tasks; a span can also be started from an explicit parent
+- Finished spans are exported in batches from a background thread, as
+  OTLP/HTTP JSON: appended to a JSONL file or POSTed to a collector
+- Disabled by default; span() is then a no-op
+
+Environment:
+    TRACE_EXPORTER                 none | file | otlp       (default none)
+    TRACE_FILE                     JSONL output for 'file'  (default traces.jsonl)
+    OTEL_EXPORTER_OTLP_ENDPOINT    collector base URL       (default http://localhost:4318)
+    OTEL_SERVICE_NAME              overrides the service name set by the program
+
+Per-turn breakdown of an exported file:
+    python tracing.py summarize traces.jsonl
+"""
+
+import argparse
+import atexit
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+import urllib.request
+from typing import NamedTuple, Optional
+
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none").lower()
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4318").rstrip("/")
+TRACE_BATCH_SIZE = 256
+TRACE_FLUSH_INTERVAL = 1.0  # seconds
+
+ENABLED = TRACE_EXPORTER in ("file", "otlp")
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "")
+
+# OTLP span kinds
+INTERNAL, SERVER, CLIENT = 1, 2, 3
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+class SpanContext(NamedTuple):
+    trace_id: str
+    span_id: str
+    sampled: bool = True
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+_current: contextvars.ContextVar[Optional[SpanContext]] = contextvars.ContextVar(
+    "current_span", default=None
+)
+
+def set_service_name(name: str):
+    """Name this process reports; OTEL_SERVICE_NAME wins when set."""
+    global SERVICE_NAME
+    SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME") or name
+
+# --------------------------------------------------------------------
+# Propagation
+# --------------------------------------------------------------------
+def extract(traceparent) -> Optional[SpanContext]:
+    """Parse a traceparent value; None when absent or malformed."""
+    match = _TRACEPARENT.match(str(traceparent or "").strip().lower())
+    if not match or set(match.group(1)) == {"0"} or set(match.group(2)) == {"0"}:
+        return None
+    return SpanContext(match.group(1), match.group(2), int(match.group(3), 16) & 1 == 1)
+
+def current() -> Optional[SpanContext]:
+    return _current.get()
+
+def traceparent() -> Optional[str]:
+    """traceparent of the current span, if any."""
+    ctx = _current.get()
+    return ctx.traceparent() if ctx else None
+
+def inject(headers: dict) -> dict:
+    """Add the current traceparent to `headers` (in place) and return it."""
+    ctx = _current.get()
+    if ctx is not None:
+        headers["traceparent"] = ctx.traceparent()
+    return headers
+
+def inject_meta(params: dict) -> dict:
+    """Add the current traceparent to JSON-RPC params under _meta."""
+    ctx = _current.get()
+    if ctx is not None:
+        params.setdefault("_meta", {})["traceparent"] = ctx.traceparent()
+    return params
+
+# --------------------------------------------------------------------
+# Spans
+# --------------------------------------------------------------------
+def _attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+class Span:
+    __slots__ = ("name", "context", "parent_id", "kind", "start_ns", "end_ns",
+                 "attributes", "error")
+
+    def __init__(self, name: str, context: SpanContext, parent_id: Optional[str],
+                 kind: int = INTERNAL, start_ns: Optional[int] = None, attributes: dict = None):
+        self.name = name
+        self.context = context
+        self.parent_id = parent_id
+        self.kind = kind
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = None
+        self.attributes = dict(attributes or {})
+        self.error = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def record_error(self, error):
+        self.error = str(error) or type(error).__name__
+
+    def end(self, end_ns: Optional[int] = None):
+        if self.end_ns is None:
+            self.end_ns = end_ns or time.time_ns()
+            if self.context.sampled:
+                _EXPORTER.submit(self)
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.context.trace_id,
+            "spanId": self.context.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_attribute(k, v) for k, v in self.attributes.items() if v is not None],
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        if self.error:
+            span["status"] = {"code": 2, "message": self.error}
+        return span
+
+class _NoopSpan:
+    """Stands in for Span while tracing is disabled."""
+    context = None
+
+    def set_attribute(self, key, value):
+        pass
+
+    def record_error(self, error):
+        pass
+
+    def end(self, end_ns=None):
+        pass
+
+NOOP_SPAN = _NoopSpan()
+
+def start_span(name: str, parent: Optional[SpanContext] = None, kind: int = INTERNAL,
+               attributes: dict = None, start_ns: Optional[int] = None):
+    """
+    Start a span that the caller end()s; it does not become the current
+    span. The parent defaults to the current span; with neither, a new
+    trace begins.
+    """
+    if not ENABLED:
+        return NOOP_SPAN
+    parent = parent or _current.get()
+    context = SpanContext(
+        parent.trace_id if parent else f"{random.getrandbits(128):032x}",
+        f"{random.getrandbits(64):016x}",
+        parent.sampled if parent else True,
+    )
+    return Span(name, context, parent.span_id if parent else None, kind, start_ns, attributes)
+
+_NOOP_CONTEXT = contextlib.nullcontext(NOOP_SPAN)
+
+def span(name: str, parent: Optional[SpanContext] = None, kind: int = INTERNAL,
+         attributes: dict = None):
+    """Run the block inside a new current span; exceptions mark it failed."""
+    if not ENABLED:
+        return _NOOP_CONTEXT
+    return _span(name, parent, kind, attributes)
+
+@contextlib.contextmanager
+def _span(name, parent, kind, attributes):
+    s = start_span(name, parent, kind, attributes)
+    token = _current.set(s.context)
+    try:
+        yield s
+    except BaseException as e:
+        s.record_error(repr(e))
+        raise
+    finally:
+        _current.reset(token)
+        s.end()
+
+# --------------------------------------------------------------------
+# Export
+# --------------------------------------------------------------------
+class _Exporter:
+    """Queues finished spans; a daemon thread writes them out in batches."""
+
+    def __init__(self):
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, span: Span):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="trace-export", daemon=True)
+                    self._thread.start()
+                    atexit.register(self.flush)
+        self._queue.put(span)
+
+    def _drain(self) -> list:
+        spans = []
+        while len(spans) < TRACE_BATCH_SIZE:
+            try:
+                spans.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return spans
+
+    def _run(self):
+        while True:
+            time.sleep(TRACE_FLUSH_INTERVAL)
+            self.flush()
+
+    def flush(self):
+        while True:
+            spans = self._drain()
+            if not spans:
+                return
+            try:
+                self._write(spans)
+            except Exception as e:
+                logging.warning(f"Dropped {len(spans)} trace span(s): {e}")
+
+    def _write(self, spans: list):
+        body = json.dumps({"resourceSpans": [{
+            "resource": {"attributes": [_attribute("service.name", SERVICE_NAME or "unknown")]},
+            "scopeSpans": [{"scope": {"name": "tracing"}, "spans": [s.to_otlp() for s in spans]}],
+        }]}, separators=(",", ":"))
+        if TRACE_EXPORTER == "otlp":
+            request = urllib.request.Request(
+                f"{OTLP_ENDPOINT}/v1/traces", data=body.encode("utf-8"),
+                headers={"Content-Type": "application/json"}, method="POST",
+            )
+            with urllib.request.urlopen(request, timeout=5):
+                pass
+        else:
+            with open(TRACE_FILE, "a", encoding="utf-8") as f:
+                f.write(body + "\n")
+
+_EXPORTER = _Exporter()
+
+def flush():
+    """Write out every span finished so far."""
+    _EXPORTER.flush()
+
+# --------------------------------------------------------------------
+# CLI: per-trace latency breakdown of an exported file
+# --------------------------------------------------------------------
+def summarize(path: str):
+    spans = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            for resource in json.loads(line).get("resourceSpans", []):
+                service = next((a["value"]["stringValue"] for a in resource["resource"]["attributes"]
+                                if a["key"] == "service.name"), "?")
+                for scope in resource.get("scopeSpans", []):
+                    spans.extend({**s, "service": service} for s in scope.get("spans", []))
+
+    children: dict = {}
+    for s in spans:
+        children.setdefault((s["traceId"], s.get("parentSpanId")), []).append(s)
+    known = {(s["traceId"], s["spanId"]) for s in spans}
+    roots = [s for s in spans if (s["traceId"], s.get("parentSpanId")) not in known]
+
+    def show(s: dict, depth: int):
+        ms = (int(s["endTimeUnixNano"]) - int(s["startTimeUnixNano"])) / 1e6
+        failed = " ❌" if s.get("status", {}).get("code") == 2 else ""
+        print(f"{'  ' * depth}{s['name']:<{44 - 2 * depth}} {ms:>9.1f} ms  [{s['service']}]{failed}")
+        for child in sorted(children.get((s["traceId"], s["spanId"]), []),
+                            key=lambda c: int(c["startTimeUnixNano"])):
+            show(child, depth + 1)
+
+    for root in sorted(roots, key=lambda s: int(s["startTimeUnixNano"])):
+        print(f"trace {root['traceId']}")
+        show(root, 1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect exported traces.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    summary = sub.add_parser("summarize", help="print each trace as a tree of span durations")
+    summary.add_argument("file")
+    cli = parser.parse_args()
+    summarize(cli.file)
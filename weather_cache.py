@@ -0,0 +1,163 @@
+"""
+Weather Response Cache
+----------------------
+In-process TTL + LRU cache that sits in front of OpenWeatherMap.
+- Keys are normalized city names (case, whitespace and diacritics folded)
+- Size-bounded LRU eviction with hit / miss / stale / eviction counters
+- Stale-while-revalidate: entries past their TTL stay servable for a grace
+  window, and the caller is told to refresh them in the background
+- Stale-if-error: expired entries are kept a while longer, only to be
+  served when the upstream cannot be reached
+- Single-flight: concurrent lookups for one key share one upstream request
+"""
+
+import asyncio
+import time
+import unicodedata
+from collections import OrderedDict
+
+# --------------------------------------------------------------------
+# Key normalization
+# --------------------------------------------------------------------
+def normalize_city(city: str) -> str:
+    """'  São   PAULO ' -> 'sao paulo'"""
+    decomposed = unicodedata.normalize("NFKD", str(city))
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(stripped.casefold().split())
+
+# --------------------------------------------------------------------
+# TTL + LRU cache
+# --------------------------------------------------------------------
+class TTLCache:
+    """
+    LRU cache whose entries are fresh for `ttl` seconds and then stale for
+    another `stale_ttl` seconds. After that get() misses, but the entry is
+    kept for `stale_if_error` more seconds for get_if_error(). A `ttl` of 0
+    disables caching.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 600, stale_ttl: float = 300,
+                 stale_if_error: float = 0, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.stale_if_error = stale_if_error
+        self._clock = clock
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.error_hits = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_size > 0
+
+    def get(self, key):
+        """
+        Return (value, is_stale) for a servable entry, or None on a miss.
+        Stale entries are still returned so the caller can serve them while
+        it revalidates.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        value, stored_at = entry
+        age = self._clock() - stored_at
+        if age > self.ttl + self.stale_ttl:
+            if age > self.ttl + self.stale_ttl + self.stale_if_error:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        if age > self.ttl:
+            self.stale_hits += 1
+            return value, True
+        self.hits += 1
+        return value, False
+
+    def get_if_error(self, key):
+        """
+        Return (value, age in seconds) for any entry still held, however
+        stale, or None. For answering when a fresh value cannot be fetched.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, stored_at = entry
+        age = self._clock() - stored_at
+        if age > self.ttl + self.stale_ttl + self.stale_if_error:
+            del self._entries[key]
+            return None
+        self.error_hits += 1
+        return value, age
+
+    def set(self, key, value):
+        if not self.enabled:
+            return
+        self._entries[key] = (value, self._clock())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "error_hits": self.error_hits,
+            "evictions": self.evictions,
+            "hit_ratio": (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+        }
+
+# --------------------------------------------------------------------
+# Single-flight request coalescing
+# --------------------------------------------------------------------
+class SingleFlight:
+    """
+    Collapse concurrent calls for the same key into one in-flight task.
+    Every caller receives that task's result (or exception). Cancelling a
+    waiter does not cancel the shared task.
+    """
+
+    def __init__(self):
+        self._inflight: dict = {}
+        self.started = 0
+        self.shared = 0
+
+    def in_flight(self, key) -> bool:
+        return key in self._inflight
+
+    async def do(self, key, fn, *args):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(fn(*args))
+            self._inflight[key] = task
+            self.started += 1
+            task.add_done_callback(lambda t: self._finish(key, t))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # mark retrieved even if every waiter went away
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._inflight), "started": self.started, "shared": self.shared}